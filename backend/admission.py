@@ -0,0 +1,205 @@
+"""
+Admission control: token-bucket rate limits and a concurrency limit
+
+Every request draws tokens from a bucket shared by all clients, and
+authenticated requests also from their user's bucket, keyed by the user
+the token was issued to. Logins draw from a bucket per email. Search,
+stats, login and the other expensive routes cost several tokens, so a
+client polling them in a loop runs dry first. An empty user bucket gets
+429 and an empty shared bucket 503, both with the Retry-After when the
+bucket will hold enough again.
+
+At most MAX_CONCURRENT_REQUESTS run at once. Up to REQUEST_QUEUE_DEPTH
+more wait REQUEST_QUEUE_TIMEOUT_MS for a slot; anything beyond that is
+shed with 503 straight away instead of queueing without bound.
+
+Buckets live in process by default. set_backend() installs a store shared
+by all workers; it only needs incrby and expire, which a Redis client
+provides.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque
+
+from starlette.requests import HTTPConnection
+
+from cache import TTLCache
+from config import settings
+import metrics
+
+metrics.registry.counter("todo_requests_shed_total", "Requests rejected by admission control")
+
+# Tokens taken by each (method, route template); anything else takes one
+ROUTE_COSTS = {
+    ("POST", "/auth/login"): 5,
+    ("POST", "/auth/register"): 5,
+    ("GET", "/todos/stats/summary"): 3,
+    ("GET", "/todos/agenda"): 3,
+    ("GET", "/todos/export"): 5,
+    ("POST", "/todos/import"): 5,
+    ("POST", "/todos/batch/where"): 3,
+    # Scrapes must get through even when the API is overloaded
+    ("GET", "/metrics"): 0,
+}
+# GET /todos with ?search= runs a full-text query
+SEARCH_COST = 3
+
+class Throttled(Exception):
+    """Raised when a request is refused admission"""
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        self.status_code = status_code
+        self.retry_after = max(math.ceil(retry_after), 1)
+        self.reason = reason
+
+class BucketBackend:
+    """Interface for the store holding token buckets"""
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """Take cost tokens, returning 0 or the seconds until they'd be there"""
+        raise NotImplementedError
+
+class LocalBackend(BucketBackend):
+    """In-process token buckets"""
+
+    def __init__(self, maxsize: int):
+        # A bucket left alone until it is full again is the same as no bucket
+        self._buckets = TTLCache(maxsize, 0)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < cost:
+                return (cost - tokens) / rate
+            self._buckets.set(key, (tokens - cost, now), burst / rate)
+            return 0.0
+
+class ExternalBackend(BucketBackend):
+    """Buckets in a shared store client with incrby/expire, such as Redis
+
+    Each bucket is approximated by a counter per refill period (burst /
+    rate seconds) allowing burst tokens, so the long-run rate matches
+    while a client can get up to twice the burst across a period boundary.
+    """
+
+    def __init__(self, client, prefix: str = "todo-api:"):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        period = max(burst / rate, 1.0)
+        now = time.time()
+        window = int(now // period)
+        name = f"{self.prefix}bucket:{key}:{window}"
+        used = self.client.incrby(name, int(math.ceil(cost)))
+        if used == math.ceil(cost):
+            self.client.expire(name, int(math.ceil(period)) + 1)
+        if used > burst:
+            return (window + 1) * period - now
+        return 0.0
+
+class ConcurrencyLimiter:
+    """Caps requests in flight, with a bounded FIFO of waiters"""
+
+    def __init__(self):
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self, limit: int, queue_depth: int, timeout: float):
+        if self.active < limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= queue_depth:
+            raise Throttled(503, 1, "concurrency")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot straight to the waiter
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise Throttled(503, 1, "concurrency")
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+backend: BucketBackend = LocalBackend(settings.rate_limit_buckets)
+limiter = ConcurrencyLimiter()
+
+def set_backend(new_backend: BucketBackend):
+    """Replace the bucket store, e.g. with one shared between workers"""
+    global backend
+    backend = new_backend
+
+def request_cost(connection: HTTPConnection) -> int:
+    """Tokens a request takes, by its route and for GET /todos its search"""
+    method = connection.scope.get("method")
+    path = getattr(connection.scope.get("route"), "path", None)
+    if method == "GET" and path == "/todos" and connection.query_params.get("search"):
+        return SEARCH_COST
+    return ROUTE_COSTS.get((method, path), 1)
+
+def _take(key: str, cost: float, rate: float, burst: float, status_code: int, reason: str):
+    wait = backend.take(key, min(cost, burst), rate, burst)
+    if wait > 0:
+        metrics.registry.inc("todo_requests_shed_total", reason=reason)
+        raise Throttled(status_code, wait, reason)
+
+async def admit(connection: HTTPConnection):
+    """App-wide dependency: the shared bucket and a concurrency slot"""
+    cost = request_cost(connection)
+    if not settings.admission_enabled or connection.scope["type"] != "http" or cost == 0:
+        yield
+        return
+
+    _take("global", cost, settings.global_rate_limit, settings.global_rate_burst, 503, "global_rate")
+    try:
+        await limiter.acquire(
+            settings.max_concurrent_requests,
+            settings.request_queue_depth,
+            settings.request_queue_timeout_ms / 1000,
+        )
+    except Throttled:
+        metrics.registry.inc("todo_requests_shed_total", reason="concurrency")
+        raise
+    try:
+        yield
+    finally:
+        limiter.release()
+
+def admit_user(connection: HTTPConnection, user_id: int):
+    """Charge a request to its user's bucket"""
+    if settings.admission_enabled:
+        _take(
+            f"user:{user_id}", request_cost(connection),
+            settings.user_rate_limit, settings.user_rate_burst, 429, "user_rate",
+        )
+
+def admit_login(connection: HTTPConnection, email: str):
+    """Charge a login attempt to the email's bucket"""
+    if settings.admission_enabled:
+        _take(
+            f"login:{email.lower()}", request_cost(connection),
+            settings.user_rate_limit, settings.user_rate_burst, 429, "login_rate",
+        )
@@ -0,0 +1,49 @@
+"""
+Background compaction of old completed todos into the archive table
+
+Todos completed (and untouched) for ARCHIVE_AFTER_DAYS are moved out of
+the hot todos table in batches of ARCHIVE_BATCH_SIZE, each in its own
+short transaction, so owner-scoped queries stop paying for finished work.
+Archived todos are still listed and counted when a request asks for them
+with include_archived, and POST /todos/restore moves them back.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from config import settings
+import async_crud
+import shards
+
+logger = logging.getLogger(__name__)
+
+async def compact(after_days: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+    """Archive every todo that qualifies now on every shard, returning how many moved"""
+    after_days = settings.archive_after_days if after_days is None else after_days
+    batch_size = batch_size or settings.archive_batch_size
+    completed_before = datetime.utcnow() - timedelta(days=after_days)
+
+    moved = 0
+    for shard in shards.router.shards:
+        async with shard.AsyncSessionLocal() as db:
+            while True:
+                count = await async_crud.archive_completed_todos(db, completed_before, batch_size)
+                moved += count
+                if count < batch_size:
+                    break
+                # Let requests waiting on the write lock in between batches
+                await asyncio.sleep(0)
+    return moved
+
+async def run_periodically(interval: Optional[float] = None):
+    """Compact forever, every ARCHIVE_INTERVAL_SECONDS"""
+    interval = interval or settings.archive_interval_seconds
+    while True:
+        try:
+            moved = await compact()
+            if moved:
+                logger.info("Archived %d completed todos", moved)
+        except Exception:
+            logger.exception("Archive compaction failed")
+        await asyncio.sleep(interval)
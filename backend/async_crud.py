@@ -0,0 +1,150 @@
+"""
+Async versions of the crud functions
+
+Each function runs the matching crud function on an AsyncSession via
+run_sync, so the queries stay defined in one place while the database
+I/O goes through the async driver and never blocks the event loop.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, tzinfo
+from typing import AsyncIterator, Optional, List
+
+from models import User
+from schemas import UserCreate, TodoCreate, TodoUpdate, TodoBatchUpdateItem, TodoFilter
+from config import settings
+import crud
+import writes
+
+# User CRUD operations
+async def get_user(db: AsyncSession, user_id: int):
+    """Get user by ID"""
+    return await db.run_sync(crud.get_user, user_id)
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    """Get user by email"""
+    return await db.run_sync(crud.get_user_by_email, email)
+
+async def create_user(db: AsyncSession, user: UserCreate, hashed_password: Optional[str] = None):
+    """Create a new user, hashing the password unless a hash is given"""
+    return await db.run_sync(crud.create_user, user, hashed_password)
+
+async def update_user_password_hash(db: AsyncSession, user: User, hashed_password: str):
+    """Replace a user's stored password hash"""
+    return await db.run_sync(crud.update_user_password_hash, user, hashed_password)
+
+# Shard directory
+async def get_user_shard(db: AsyncSession, user_id: int) -> int:
+    """Return the shard holding a user's todos"""
+    return await db.run_sync(crud.get_user_shard, user_id)
+
+async def set_user_shard(db: AsyncSession, user_id: int, shard: int):
+    """Record which shard holds a user's todos"""
+    return await db.run_sync(crud.set_user_shard, user_id, shard)
+
+async def ensure_shard_user(db: AsyncSession, user: User):
+    """Copy a user's row onto a shard"""
+    return await db.run_sync(crud.ensure_shard_user, user)
+
+# Todo CRUD operations
+async def get_todos(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    priority: Optional[str] = None,
+    completed: Optional[bool] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    include_archived: bool = False
+):
+    """Get todos with optional filtering"""
+    return await db.run_sync(
+        crud.get_todos,
+        user_id=user_id,
+        skip=skip,
+        limit=limit,
+        category=category,
+        priority=priority,
+        completed=completed,
+        search=search,
+        cursor=cursor,
+        columns=columns,
+        include_archived=include_archived
+    )
+
+async def get_todo(db: AsyncSession, todo_id: int, user_id: int, columns: Optional[List[str]] = None):
+    """Get a specific todo by ID for a user"""
+    return await db.run_sync(crud.get_todo, todo_id, user_id, columns)
+
+async def create_todo(db: AsyncSession, todo: TodoCreate, user_id: int):
+    """Create a new todo"""
+    return await _write(db, crud.create_todo, todo, user_id)
+
+async def update_todo(db: AsyncSession, todo_id: int, todo_update: TodoUpdate, user_id: int):
+    """Update a todo"""
+    return await _write(db, crud.update_todo, todo_id, todo_update, user_id)
+
+async def delete_todo(db: AsyncSession, todo_id: int, user_id: int):
+    """Delete a todo"""
+    return await _write(db, crud.delete_todo, todo_id, user_id)
+
+async def _write(db: AsyncSession, func, *args):
+    """Run a single-todo write, through group commit when it is enabled"""
+    if settings.write_coalescing_enabled:
+        return await writes.submit(db, func, *args)
+    return await db.run_sync(func, *args)
+
+async def create_todos(db: AsyncSession, todos: List[TodoCreate], user_id: int):
+    """Create many todos with one bulk INSERT, returning their ids in order"""
+    return await db.run_sync(crud.create_todos, todos, user_id)
+
+async def update_todos(db: AsyncSession, updates: List[TodoBatchUpdateItem], user_id: int):
+    """Apply many partial updates in one transaction"""
+    return await db.run_sync(crud.update_todos, updates, user_id)
+
+async def delete_todos(db: AsyncSession, todo_ids: List[int], user_id: int):
+    """Delete many todos with one DELETE, returning the ids that were removed"""
+    return await db.run_sync(crud.delete_todos, todo_ids, user_id)
+
+async def apply_todo_action(db: AsyncSession, todo_filter: TodoFilter, action: str, user_id: int) -> int:
+    """Complete, reopen or delete every todo matching a filter in one statement"""
+    return await db.run_sync(crud.apply_todo_action, todo_filter, action, user_id)
+
+async def archive_completed_todos(db: AsyncSession, completed_before: datetime, batch_size: int) -> int:
+    """Move one batch of todos finished before a cutoff into the archive"""
+    return await db.run_sync(crud.archive_completed_todos, completed_before, batch_size)
+
+async def restore_todos(db: AsyncSession, todo_ids: List[int], user_id: int) -> set:
+    """Move a user's archived todos back into the hot table"""
+    return await db.run_sync(crud.restore_todos, todo_ids, user_id)
+
+async def stream_todos(
+    db: AsyncSession, user_id: int, fields: List[str], chunk_size: int = 500
+) -> AsyncIterator[dict]:
+    """Yield a user's todos as row mappings through a server-side cursor"""
+    query = crud.todo_export_query(user_id, fields).execution_options(yield_per=chunk_size)
+    result = await db.stream(query)
+    async for row in result.mappings():
+        yield row
+
+async def get_data_version(db: AsyncSession, user_id: int):
+    """Return a user's (version, updated_at); 0 if their todos never changed"""
+    return await db.run_sync(crud.get_data_version, user_id)
+
+async def get_todo_stats(db: AsyncSession, user_id: int, include_archived: bool = False):
+    """Get todo statistics for a user"""
+    return await db.run_sync(crud.get_todo_stats, user_id, include_archived)
+
+async def get_todo_agenda(
+    db: AsyncSession,
+    user_id: int,
+    start: date,
+    end: date,
+    zone: tzinfo,
+    completed: Optional[bool] = False,
+    limit: int = 500
+):
+    """Get a user's todos due in a date range, with per-day and per-week counts"""
+    return await db.run_sync(crud.get_todo_agenda, user_id, start, end, zone, completed, limit)
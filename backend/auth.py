@@ -1,34 +1,38 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-import os
-from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
-import crud
+from cache import TTLCache
+from config import settings
+from database import get_db
+from models import User
+import admission
+import async_crud
 
-load_dotenv()
-
-# Security configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
+# Security configuration, read from the environment or .env by config.py
+SECRET_KEY = settings.secret_key
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
-
+# Authenticated users by id. Entries are detached User rows, dropped on any
+# change to the user and otherwise refreshed after the TTL.
+user_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
 
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    user_cache.pop(target.id)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
+    # jose is imported on first use to keep it out of worker start-up
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -39,19 +43,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get current authenticated user"""
+    """Get current authenticated user, charging the request to their rate limit"""
+    user = await authenticate_token(credentials.credentials, db)
+    admission.admit_user(request, user.id)
+    return user
+
+async def authenticate_token(token: str, db: AsyncSession) -> User:
+    """Resolve a bearer token to an active user, raising 401 otherwise
+
+    Tokens carrying a user_id claim are resolved from the user cache, or by
+    primary key on a miss; older tokens fall back to an email lookup.
+    """
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -59,16 +68,24 @@ async def get_current_user(
     )
     
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
+        user_id: Optional[int] = payload.get("user_id")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = crud.get_user_by_email(db, email=email)
-    if user is None:
+    if user_id is None:
+        user = await async_crud.get_user_by_email(db, email=email)
+    else:
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await async_crud.get_user(db, user_id=user_id)
+            if user is not None:
+                user_cache.set(user_id, user)
+    
+    if user is None or user.email != email or not user.is_active:
         raise credentials_exception
     
     return user
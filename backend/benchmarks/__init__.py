@@ -0,0 +1 @@
+# Load-testing and latency benchmarks for the Todo API
@@ -0,0 +1,389 @@
+"""
+Drive every HTTP route of the Todo API in-process and report latency
+
+Usage (from the backend directory):
+    python -m benchmarks.run --users 10 --todos-per-user 10000 \\
+        --requests 500 --concurrency 20 --save baseline.json
+    python -m benchmarks.run --skip-seed --compare baseline.json
+
+Requests go through httpx's ASGI transport straight into the app, so the
+numbers cover routing, auth, SQL and serialization without network noise.
+Each endpoint reports throughput and p50/p95/p99 latency; --save writes
+them as a JSON baseline and --compare flags endpoints that got slower.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'todo-bench.db')}"
+
+# Routes with no scenario, and why
+UNDRIVEN_ROUTES = {
+    "WS /ws/todos": "a long-lived connection has no per-request latency to measure",
+}
+
+class Context:
+    """State shared by the scenarios of one run"""
+
+    def __init__(self, users: List[dict], seed: int = 0):
+        self.users = users
+        self.rng = random.Random(seed)
+        self.created: List[tuple] = []
+        self.counter = 0
+
+    def user(self) -> dict:
+        return self.rng.choice(self.users)
+
+    def todo(self) -> tuple:
+        user = self.user()
+        return user, self.rng.choice(user["todo_ids"])
+
+def _scenarios() -> Dict[str, Callable]:
+    """Endpoint name -> coroutine function(client, ctx) returning a response
+
+    Reads come before writes, and deletes last, so the write scenarios
+    don't change what the read scenarios measure.
+    """
+    from benchmarks.seed import PASSWORD
+
+    async def root(client, ctx):
+        return await client.get("/")
+
+    async def read_metrics(client, ctx):
+        return await client.get("/metrics")
+
+    async def login(client, ctx):
+        user = ctx.user()
+        return await client.post("/auth/login", params={"email": user["email"], "password": PASSWORD})
+
+    async def me(client, ctx):
+        return await client.get("/auth/me", headers=ctx.user()["headers"])
+
+    async def list_todos(client, ctx):
+        return await client.get("/todos", headers=ctx.user()["headers"])
+
+    async def list_filtered(client, ctx):
+        params = {"category": "work", "completed": False, "limit": 50}
+        return await client.get("/todos", params=params, headers=ctx.user()["headers"])
+
+    async def list_search(client, ctx):
+        params = {"search": ctx.rng.choice(["mil", "bank rep", "plan trip", "gym"])}
+        return await client.get("/todos", params=params, headers=ctx.user()["headers"])
+
+    async def list_deep_offset(client, ctx):
+        user = ctx.user()
+        params = {"skip": max(len(user["todo_ids"]) - 100, 0)}
+        return await client.get("/todos", params=params, headers=user["headers"])
+
+    async def list_deep_cursor(client, ctx):
+        user = ctx.user()
+        params = {"cursor": user["deep_cursor"]} if user["deep_cursor"] else {}
+        return await client.get("/todos", params=params, headers=user["headers"])
+
+    async def get_todo(client, ctx):
+        user, todo_id = ctx.todo()
+        return await client.get(f"/todos/{todo_id}", headers=user["headers"])
+
+    async def stats(client, ctx):
+        return await client.get("/todos/stats/summary", headers=ctx.user()["headers"])
+
+    async def agenda(client, ctx):
+        # A six-week calendar view starting last week
+        start = date.today() - timedelta(days=7)
+        params = {"start": start.isoformat(), "end": (start + timedelta(days=42)).isoformat(), "tz": "Europe/Berlin"}
+        return await client.get("/todos/agenda", params=params, headers=ctx.user()["headers"])
+
+    async def export(client, ctx):
+        return await client.get("/todos/export", headers=ctx.user()["headers"])
+
+    async def register(client, ctx):
+        ctx.counter += 1
+        email = f"bench-register-{os.getpid()}-{time.time_ns()}-{ctx.counter}@example.com"
+        return await client.post(
+            "/auth/register",
+            json={"email": email, "full_name": "Benchmark", "password": PASSWORD},
+        )
+
+    async def create_todo(client, ctx):
+        user = ctx.user()
+        response = await client.post("/todos", json={"title": "Benchmark todo"}, headers=user["headers"])
+        if response.status_code == 200:
+            ctx.created.append((user, response.json()["id"]))
+        return response
+
+    async def update_todo(client, ctx):
+        user, todo_id = ctx.todo()
+        payload = {"completed": ctx.rng.random() < 0.5}
+        return await client.put(f"/todos/{todo_id}", json=payload, headers=user["headers"])
+
+    async def batch_create(client, ctx):
+        user = ctx.user()
+        payload = {"todos": [{"title": f"Batch {i}"} for i in range(20)]}
+        response = await client.post("/todos/batch", json=payload, headers=user["headers"])
+        if response.status_code == 200:
+            ctx.created += [(user, result["id"]) for result in response.json()["results"]]
+        return response
+
+    async def batch_update(client, ctx):
+        user = ctx.user()
+        ids = ctx.rng.sample(user["todo_ids"], min(20, len(user["todo_ids"])))
+        payload = {"updates": [{"id": todo_id, "priority": "high"} for todo_id in ids]}
+        return await client.patch("/todos/batch", json=payload, headers=user["headers"])
+
+    async def batch_where(client, ctx):
+        payload = {"filter": {"category": "shopping"}, "action": "reopen"}
+        return await client.post("/todos/batch/where", json=payload, headers=ctx.user()["headers"])
+
+    async def import_todos(client, ctx):
+        body = "\n".join(json.dumps({"title": f"Imported {i}"}) for i in range(50))
+        return await client.post("/todos/import", content=body.encode(), headers=ctx.user()["headers"])
+
+    async def restore(client, ctx):
+        user = ctx.user()
+        ids = user["archived_ids"][-5:]
+        del user["archived_ids"][-5:]
+        return await client.post("/todos/restore", json={"ids": ids or [0]}, headers=user["headers"])
+
+    async def batch_delete(client, ctx):
+        batch, ctx.created = ctx.created[:20], ctx.created[20:]
+        user = batch[0][0] if batch else ctx.user()
+        ids = [todo_id for owner, todo_id in batch if owner is user]
+        return await client.post("/todos/batch/delete", json={"ids": ids}, headers=user["headers"])
+
+    async def delete_todo(client, ctx):
+        if not ctx.created:
+            return await create_todo(client, ctx)
+        user, todo_id = ctx.created.pop()
+        return await client.delete(f"/todos/{todo_id}", headers=user["headers"])
+
+    return {
+        "GET /": root,
+        "GET /metrics": read_metrics,
+        "POST /auth/login": login,
+        "GET /auth/me": me,
+        "GET /todos": list_todos,
+        "GET /todos (filtered)": list_filtered,
+        "GET /todos (search)": list_search,
+        "GET /todos (deep offset)": list_deep_offset,
+        "GET /todos (deep cursor)": list_deep_cursor,
+        "GET /todos/{id}": get_todo,
+        "GET /todos/stats/summary": stats,
+        "GET /todos/agenda": agenda,
+        "GET /todos/export": export,
+        "POST /auth/register": register,
+        "POST /todos": create_todo,
+        "PUT /todos/{id}": update_todo,
+        "POST /todos/batch": batch_create,
+        "PATCH /todos/batch": batch_update,
+        "POST /todos/batch/where": batch_where,
+        "POST /todos/import": import_todos,
+        "POST /todos/restore": restore,
+        "POST /todos/batch/delete": batch_delete,
+        "DELETE /todos/{id}": delete_todo,
+    }
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    """Throughput and latency percentiles (milliseconds) for one endpoint"""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+    }
+
+async def run_endpoint(client, ctx: Context, scenario: Callable, requests: int, concurrency: int) -> dict:
+    """Issue requests for one endpoint with at most `concurrency` in flight"""
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await scenario(client, ctx)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(concurrency, 1))])
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def _load_users(app_engine, seeded) -> List[dict]:
+    """Attach tokens, todo ids, archived ids and a deep-page cursor to each seeded user"""
+    from sqlalchemy import select
+
+    import auth
+    import crud
+    from models import ArchivedTodo, Todo
+
+    users = []
+    with app_engine.connect() as conn:
+        for user_id, email in seeded:
+            todo_ids = list(conn.execute(
+                select(Todo.id).where(Todo.owner_id == user_id).order_by(Todo.id)
+            ).scalars())
+            archived_ids = list(conn.execute(
+                select(ArchivedTodo.id).where(ArchivedTodo.owner_id == user_id)
+            ).scalars())
+            deep = conn.execute(
+                select(Todo.created_at, Todo.id).where(Todo.owner_id == user_id)
+                .order_by(Todo.created_at.desc(), Todo.id.desc())
+                .offset(max(len(todo_ids) - 101, 0)).limit(1)
+            ).first()
+            token = auth.create_access_token(data={"sub": email, "user_id": user_id})
+            users.append({
+                "id": user_id,
+                "email": email,
+                "headers": {"Authorization": f"Bearer {token}"},
+                "todo_ids": todo_ids or [0],
+                "archived_ids": archived_ids,
+                "deep_cursor": crud.encode_todo_cursor(deep) if deep else None,
+            })
+    return users
+
+async def run_benchmark(
+    users: int = 5,
+    todos_per_user: int = 1000,
+    requests: int = 200,
+    concurrency: int = 10,
+    endpoints: Optional[List[str]] = None,
+    skip_seed: bool = False,
+    seed: int = 0,
+) -> dict:
+    """Seed the configured database, drive the endpoints and return a report"""
+    import httpx
+
+    import main
+    import manage
+    from benchmarks.seed import seed as seed_data
+    import crud
+    from database import SessionLocal, engine
+
+    manage.migrate_all()
+    seeded = seed_data(engine, users, 0 if skip_seed else todos_per_user, seed)
+    with SessionLocal() as db:
+        # Archive some completed todos for the restore scenario to bring back
+        crud.archive_completed_todos(db, datetime.utcnow(), requests * 5)
+
+    ctx = Context(await _load_users(engine, seeded), seed)
+    scenarios = _scenarios()
+    if endpoints:
+        scenarios = {name: fn for name, fn in scenarios.items() if name in endpoints}
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name, scenario in scenarios.items():
+            results[name] = await run_endpoint(client, ctx, scenario, requests, concurrency)
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "database": engine.dialect.name,
+            "users": users,
+            "todos_per_user": todos_per_user,
+            "requests": requests,
+            "concurrency": concurrency,
+        },
+        "endpoints": results,
+    }
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Return the endpoints whose p95 or throughput regressed past threshold (%)"""
+    regressions = []
+    for name, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        slower = before["p95_ms"] and (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        fewer = before["throughput_rps"] and (before["throughput_rps"] - now["throughput_rps"]) / before["throughput_rps"] * 100
+        if slower > threshold or fewer > threshold:
+            regressions.append(name)
+    return regressions
+
+def format_report(report: dict, baseline: Optional[dict] = None) -> str:
+    lines = [f"{'endpoint':<28} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"]
+    for name, result in report["endpoints"].items():
+        line = (
+            f"{name:<28} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.2f} "
+            f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>7}"
+        )
+        before = (baseline or {}).get("endpoints", {}).get(name)
+        if before and before["p95_ms"]:
+            change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Todo API in-process")
+    parser.add_argument("--database-url", default=None,
+                        help=f"database to seed and benchmark (default {DEFAULT_DATABASE_URL})")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--todos-per-user", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--endpoint", action="append", dest="endpoints",
+                        help="only run this endpoint (repeatable), e.g. 'GET /todos'")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse an already seeded database")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for data and requests")
+    parser.add_argument("--save", help="write the report as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    # The app reads its settings at import, so configure before importing it
+    os.environ["DATABASE_URL"] = args.database_url or os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+    report = asyncio.run(run_benchmark(
+        users=args.users,
+        todos_per_user=args.todos_per_user,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        endpoints=args.endpoints,
+        skip_seed=args.skip_seed,
+        seed=args.seed,
+    ))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if baseline:
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"Regressed beyond {args.threshold}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
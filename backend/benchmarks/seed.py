@@ -0,0 +1,85 @@
+"""
+Seed a benchmark dataset of users and todos
+
+Rows go in through chunked executemany INSERTs on the sync engine, and
+every user shares one precomputed password hash, so millions of todos can
+be loaded without paying for bcrypt or the ORM per row.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+import crud
+import hashing
+from config import settings
+from models import CategoryType, PriorityLevel, Todo, User
+
+PASSWORD = "benchmark-password"
+EMAIL_TEMPLATE = "bench-user-{}@example.com"
+CHUNK_SIZE = 10000
+
+WORDS = [
+    "buy", "milk", "call", "bank", "write", "report", "book", "dentist", "fix",
+    "bike", "plan", "trip", "review", "budget", "clean", "garage", "email",
+    "team", "water", "plants", "pay", "rent", "update", "resume", "gym",
+]
+
+def _todo_row(rng: random.Random, owner_id: int, now: datetime) -> dict:
+    completed = rng.random() < 0.3
+    return {
+        "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize(),
+        "description": " ".join(rng.choices(WORDS, k=rng.randint(0, 30))) or None,
+        "priority": rng.choice(list(PriorityLevel)),
+        "category": rng.choice(list(CategoryType)),
+        "due_date": now + timedelta(days=rng.randint(-30, 60)) if rng.random() < 0.6 else None,
+        "completed": completed,
+        "completed_at": now - timedelta(days=rng.randint(0, 30)) if completed else None,
+        "owner_id": owner_id,
+    }
+
+def seed(engine, users: int, todos_per_user: int, seed: int = 0) -> List[Tuple[int, str]]:
+    """Create users and their todos, returning [(user_id, email)]
+
+    Users that already exist (from an earlier run) are reused and get no
+    extra todos, so re-seeding the same database is cheap.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    emails = [EMAIL_TEMPLATE.format(i) for i in range(users)]
+
+    with engine.begin() as conn:
+        existing = dict(conn.execute(
+            select(User.email, User.id).where(User.email.in_(emails))
+        ).all())
+        missing = [email for email in emails if email not in existing]
+        if missing:
+            hashed_password = hashing.get_context().hash(PASSWORD)
+            conn.execute(insert(User), [
+                {"email": email, "full_name": "Benchmark User", "hashed_password": hashed_password}
+                for email in missing
+            ])
+        ids = dict(conn.execute(
+            select(User.email, User.id).where(User.email.in_(missing))
+        ).all()) if missing else {}
+
+    new_ids = [ids[email] for email in missing]
+    for start in range(0, len(new_ids) * todos_per_user, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, len(new_ids) * todos_per_user)
+        rows = [
+            _todo_row(rng, new_ids[index // todos_per_user], now)
+            for index in range(start, stop)
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(Todo), rows)
+
+    if settings.todo_counters_enabled and new_ids:
+        with Session(engine) as db:
+            for user_id in new_ids:
+                crud.rebuild_todo_counters(db, user_id)
+            db.commit()
+
+    ids.update(existing)
+    return [(ids[email], email) for email in emails]
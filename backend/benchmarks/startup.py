@@ -0,0 +1,136 @@
+"""
+Profile how long a fresh worker takes to import and start the app
+
+Usage (from the backend directory):
+    python -m benchmarks.startup --runs 5 --save startup.json
+    python -m benchmarks.startup --compare startup.json
+
+Each run is a new interpreter started with -X importtime that imports
+main and runs the app's startup, so the numbers are what every worker
+pays on boot. The report gives median import and startup time, the
+imports with the most time of their own, and any of the modules meant to
+load on first use (jose, passlib, alembic) that were imported anyway.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed on first login, token or migration, never to boot a worker
+DEFERRED_MODULES = ("jose", "passlib", "alembic")
+
+CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+deferred = [name for name in {deferred!r} if name in sys.modules]
+
+async def start():
+    lifespan = main.app.router.lifespan_context(main.app)
+    await lifespan.__aenter__()
+    ready = time.perf_counter()
+    await lifespan.__aexit__(None, None, None)
+    return ready
+
+ready = asyncio.run(start())
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "deferred_loaded": deferred,
+}}))
+"""
+
+def parse_importtime(output: str) -> List[dict]:
+    """Parse -X importtime lines into {module, self_ms, cumulative_ms, depth}"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return imports
+
+def profile_once() -> dict:
+    """Import and start the app in a new interpreter and time it"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(deferred=DEFERRED_MODULES)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run["imports"] = parse_importtime(result.stderr)
+    return run
+
+def profile(runs: int = 5, top: int = 15) -> dict:
+    """Profile several fresh starts and summarize them"""
+    samples = [profile_once() for _ in range(max(runs, 1))]
+    slowest = sorted(samples[0]["imports"], key=lambda entry: entry["self_ms"], reverse=True)
+    return {
+        "runs": len(samples),
+        "import_ms": round(statistics.median(sample["import_ms"] for sample in samples), 3),
+        "startup_ms": round(statistics.median(sample["startup_ms"] for sample in samples), 3),
+        "deferred_loaded": sorted({name for sample in samples for name in sample["deferred_loaded"]}),
+        "slowest_imports": [
+            {key: entry[key] for key in ("module", "self_ms", "cumulative_ms")}
+            for entry in slowest[:top]
+        ],
+    }
+
+def format_report(report: dict, baseline: Optional[dict] = None) -> str:
+    lines = [f"median of {report['runs']} fresh start(s)"]
+    for key, label in (("import_ms", "import main"), ("startup_ms", "app startup")):
+        line = f"{label:<16} {report[key]:>9.1f} ms"
+        if baseline and baseline.get(key):
+            line += f"   {(report[key] - baseline[key]) / baseline[key] * 100:+.1f}%"
+        lines.append(line)
+    loaded = ", ".join(report["deferred_loaded"]) or "none"
+    lines.append(f"{'deferred loaded':<16} {loaded}")
+    lines.append("slowest imports by own time, first run:")
+    for entry in report["slowest_imports"]:
+        lines.append(f"  {entry['module']:<40} {entry['self_ms']:>8.1f} ms {entry['cumulative_ms']:>9.1f} ms cumulative")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Profile Todo API import and startup time")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--save", help="write the report as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="percent slowdown of the import that counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = profile(args.runs, args.top)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    status = 0
+    if report["deferred_loaded"]:
+        print(f"Imported at start-up: {', '.join(report['deferred_loaded'])}")
+        status = 1
+    if baseline and baseline["import_ms"]:
+        if (report["import_ms"] - baseline["import_ms"]) / baseline["import_ms"] * 100 > args.threshold:
+            print(f"Import time regressed beyond {args.threshold}%")
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,96 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./todos.db"
+    # Optional read-only replica that serves the GET endpoints
+    database_read_url: Optional[str] = None
+    # Extra databases that hold some users' todos, comma-separated; shard 0
+    # is database_url
+    database_shard_urls: str = ""
     secret_key: str = "your-super-secret-key-change-this-in-production-please"
     access_token_expire_minutes: int = 30
     environment: str = "development"
     debug: bool = True
+
+    # Connection pool (ignored for in-memory SQLite)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Compiled SQL cache, and asyncpg's per-connection prepared statement cache
+    db_query_cache_size: int = 500
+    db_prepared_statement_cache_size: int = 100
+
+    # SQLite pragmas applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+
+    # Keep per-user todo counters up to date so stats are a single row lookup
+    todo_counters_enabled: bool = False
+
+    # Password hashing: bcrypt cost, worker threads and how many calls may queue
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_queue_depth: int = 32
+
+    # Authenticated users cached per worker by id, so most requests skip the DB
+    user_cache_size: int = 1024
+    user_cache_ttl_seconds: float = 60.0
+
+    # Change feed: events buffered per subscriber, and kept per user for resume
+    event_queue_size: int = 100
+    event_replay_size: int = 256
+
+    # Request latency and SQL metrics, served at /metrics; statements slower
+    # than slow_query_ms are logged
+    metrics_enabled: bool = True
+    slow_query_ms: float = 200.0
+
+    # Serve GET /todos from plain rows encoded straight to JSON, skipping
+    # per-object model validation
+    fast_todo_serialization: bool = False
+
+    # Move todos completed and untouched for archive_after_days out of the
+    # hot table, in batches, every archive_interval_seconds
+    archive_enabled: bool = False
+    archive_after_days: int = 90
+    archive_batch_size: int = 500
+    archive_interval_seconds: float = 3600.0
+
+    # Group commit: single-todo writes arriving within write_max_latency_ms
+    # share one transaction, up to write_max_batch; beyond write_queue_size
+    # queued writes, requests are shed
+    write_coalescing_enabled: bool = False
+    write_queue_size: int = 1000
+    write_max_batch: int = 64
+    write_max_latency_ms: float = 2.0
+
+    # Read-through cache of GET /todos pages, dropped per user on any change
+    result_cache_enabled: bool = False
+    result_cache_size: int = 4096
+    result_cache_ttl_seconds: float = 300.0
+
+    # Admission control: token buckets refilled at *_rate_limit tokens a
+    # second up to *_rate_burst, one per user and one shared by all requests;
+    # beyond max_concurrent_requests in flight, request_queue_depth requests
+    # wait up to request_queue_timeout_ms and the rest are shed
+    admission_enabled: bool = False
+    user_rate_limit: float = 10.0
+    user_rate_burst: float = 50.0
+    global_rate_limit: float = 1000.0
+    global_rate_burst: float = 2000.0
+    rate_limit_buckets: int = 100000
+    max_concurrent_requests: int = 100
+    request_queue_depth: int = 100
+    request_queue_timeout_ms: float = 1000.0
     
     class Config:
         env_file = ".env"
+        extra = "ignore"
 
 settings = Settings()
@@ -1,18 +1,22 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from typing import Optional, List
-from datetime import datetime, date
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, or_, func, case, literal, String, insert, update, delete, bindparam, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Optional, List, Tuple
+from datetime import datetime, date, time, timedelta, timezone, tzinfo
+from types import SimpleNamespace
+import base64
+import json
 
-from models import User, Todo, PriorityLevel, CategoryType
-from schemas import UserCreate, TodoCreate, TodoUpdate
-from passlib.context import CryptContext
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from models import User, UserShard, Todo, ArchivedTodo, TodoCounter, DataVersion, PriorityLevel, CategoryType
+from schemas import UserCreate, TodoCreate, TodoUpdate, TodoResponse, TodoBatchUpdateItem, TodoFilter
+from config import settings
+import events
+import hashing
+import search as search_index
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return hashing.get_context().hash(password)
 
 # User CRUD operations
 def get_user(db: Session, user_id: int):
@@ -23,9 +27,10 @@ def get_user_by_email(db: Session, email: str):
     """Get user by email"""
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate):
-    """Create a new user"""
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None):
+    """Create a new user, hashing the password unless a hash is given"""
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = User(
         email=user.email,
         full_name=user.full_name,
@@ -36,6 +41,42 @@ def create_user(db: Session, user: UserCreate):
     db.refresh(db_user)
     return db_user
 
+def update_user_password_hash(db: Session, user: User, hashed_password: str):
+    """Replace a user's stored password hash"""
+    user.hashed_password = hashed_password
+    db.commit()
+    return user
+
+# Shard directory, kept on the primary database
+def get_user_shard(db: Session, user_id: int) -> int:
+    """Return the shard holding a user's todos"""
+    shard = db.scalar(select(UserShard.shard).where(UserShard.owner_id == user_id))
+    return shard or 0
+
+def set_user_shard(db: Session, user_id: int, shard: int):
+    """Record which shard holds a user's todos"""
+    row = db.get(UserShard, user_id)
+    if row is None:
+        db.add(UserShard(owner_id=user_id, shard=shard))
+    else:
+        row.shard = shard
+    db.commit()
+
+def ensure_shard_user(db: Session, user: User):
+    """Copy a user's row onto a shard so its todos' foreign keys resolve
+
+    The copy carries no password hash; logins only read the primary.
+    """
+    if db.get(User, user.id) is None:
+        db.add(User(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            hashed_password="!",
+            is_active=user.is_active
+        ))
+        db.commit()
+
 # Todo CRUD operations
 def get_todos(
     db: Session,
@@ -45,33 +86,122 @@ def get_todos(
     category: Optional[str] = None,
     priority: Optional[str] = None,
     completed: Optional[bool] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    include_archived: bool = False
 ):
-    """Get todos with optional filtering"""
-    query = db.query(Todo).filter(Todo.owner_id == user_id)
+    """Get todos with optional filtering
+
+    Search results come best match first. When a cursor from
+    encode_todo_cursor is given, the page starts right after that todo in
+    chronological order and skip is ignored. With columns, plain rows of
+    just those columns are returned instead of Todo objects.
+
+    include_archived adds archived todos, in chronological order only.
+    """
+    if include_archived and completed is not False:
+        source = aliased(Todo, _todos_with_archive(db, user_id, category, priority, completed, search))
+        query = _select_todos(source, columns)
+    else:
+        source = Todo
+        query = _select_todos(source, columns).where(
+            *_todo_conditions(Todo, user_id, category, priority, completed)
+        )
+        if search:
+            # Rank by relevance unless a cursor pins the chronological order
+            query = search_index.apply_search(query, db.get_bind(), search, rank=not cursor)
+    
+    query = query.order_by(source.created_at.desc(), source.id.desc())
+    
+    if cursor:
+        created_at, todo_id = decode_todo_cursor(cursor)
+        created_at = _cursor_datetime(db, created_at)
+        query = query.where(
+            or_(
+                source.created_at < created_at,
+                and_(source.created_at == created_at, source.id < todo_id)
+            )
+        )
+    else:
+        query = query.offset(skip)
+    
+    query = query.limit(limit)
+    if columns:
+        return db.execute(query).all()
+    return db.scalars(query).all()
+
+def _select_todos(source, columns: Optional[List[str]] = None):
+    """Select whole todos, or just the given columns"""
+    if columns:
+        return select(*[getattr(source, column) for column in columns])
+    return select(source)
+
+def _todo_conditions(model, user_id: int, category=None, priority=None, completed=None) -> list:
+    """Owner and filter conditions for the todos or archived_todos table"""
+    conditions = [model.owner_id == user_id]
     
     # Apply filters
     if category:
-        query = query.filter(Todo.category == category)
+        conditions.append(model.category == category)
     
     if priority:
-        query = query.filter(Todo.priority == priority)
+        conditions.append(model.priority == priority)
     
     if completed is not None:
-        query = query.filter(Todo.completed == completed)
+        conditions.append(model.completed == completed)
     
+    return conditions
+
+def _todos_with_archive(db: Session, user_id: int, category, priority, completed, search):
+    """Subquery of a user's hot and archived todos matching the filters"""
+    columns = [column.name for column in Todo.__table__.columns]
+    hot = select(*[getattr(Todo, column) for column in columns]).where(
+        *_todo_conditions(Todo, user_id, category, priority, completed)
+    )
+    archived = select(*[getattr(ArchivedTodo, column) for column in columns]).where(
+        *_todo_conditions(ArchivedTodo, user_id, category, priority, completed)
+    )
     if search:
-        query = query.filter(
+        hot = search_index.apply_search(hot, db.get_bind(), search, rank=False)
+        # The archive is not full-text indexed
+        archived = archived.where(
             or_(
-                Todo.title.ilike(f"%{search}%"),
-                Todo.description.ilike(f"%{search}%")
+                ArchivedTodo.title.ilike(f"%{search}%"),
+                ArchivedTodo.description.ilike(f"%{search}%")
             )
         )
-    
-    return query.order_by(Todo.created_at.desc()).offset(skip).limit(limit).all()
+    return union_all(hot, archived).subquery("todos_with_archive")
 
-def get_todo(db: Session, todo_id: int, user_id: int):
-    """Get a specific todo by ID for a user"""
+def encode_todo_cursor(todo: Todo) -> str:
+    """Encode an opaque cursor pointing just past a todo in list order"""
+    payload = json.dumps([todo.created_at.isoformat(), todo.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_todo_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor into (created_at, id), raising ValueError if invalid"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, todo_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(todo_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+def _cursor_datetime(db: Session, value: datetime):
+    """Bind a cursor timestamp so it compares equal to the stored column"""
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite stores server-side timestamps as text without microseconds
+        return literal(value.replace(tzinfo=None).isoformat(sep=" "), String)
+    return value
+
+def get_todo(db: Session, todo_id: int, user_id: int, columns: Optional[List[str]] = None):
+    """Get a specific todo by ID for a user, as a plain row when columns are given"""
+    if columns:
+        return db.execute(
+            select(*[getattr(Todo, column) for column in columns]).where(
+                Todo.id == todo_id, Todo.owner_id == user_id
+            )
+        ).first()
     return db.query(Todo).filter(
         and_(Todo.id == todo_id, Todo.owner_id == user_id)
     ).first()
@@ -87,91 +217,669 @@ def create_todo(db: Session, todo: TodoCreate, user_id: int):
         owner_id=user_id
     )
     db.add(db_todo)
+    delta = _counter_values(db_todo, 1)
+    if settings.todo_counters_enabled:
+        _apply_counter_delta(db, user_id, delta)
+    version = bump_data_version(db, user_id)
     db.commit()
     db.refresh(db_todo)
+    _publish_change(user_id, version, "todo.created", delta, todo=_todo_payload(db_todo))
     return db_todo
 
+# Columns whose old values the counters and stats deltas depend on
+COUNTED_FIELDS = ("completed", "priority", "category")
+
 def update_todo(db: Session, todo_id: int, todo_update: TodoUpdate, user_id: int):
-    """Update a todo"""
-    db_todo = get_todo(db, todo_id, user_id)
-    if not db_todo:
-        return None
-    
+    """Update a todo with one owner-scoped UPDATE ... RETURNING
+
+    The completed_at transition is decided in SQL from the row's current
+    completed flag, so a checkbox toggle is a single statement. The stats
+    delta needs the old values of counted fields: a toggle learns them by
+    matching on the old flag, and PostgreSQL returns them through a locked
+    self-join. Otherwise they are read first.
+    """
     update_data = todo_update.model_dump(exclude_unset=True)
+    if not update_data:
+        return get_todo(db, todo_id, user_id)
+    
+    owned = and_(Todo.id == todo_id, Todo.owner_id == user_id)
+    dialect = db.get_bind().dialect
+    changing = [field for field in COUNTED_FIELDS if field in update_data]
     
     # Handle completion status change
     if "completed" in update_data:
-        if update_data["completed"] and not db_todo.completed:
-            update_data["completed_at"] = datetime.utcnow()
-        elif not update_data["completed"] and db_todo.completed:
-            update_data["completed_at"] = None
+        if update_data["completed"]:
+            update_data["completed_at"] = case(
+                (Todo.completed == False, datetime.utcnow()), else_=Todo.completed_at
+            )
+        else:
+            update_data["completed_at"] = case(
+                (Todo.completed == True, None), else_=Todo.completed_at
+            )
+    
+    statement = update(Todo).values(update_data)
+    options = {"synchronize_session": False}
+    db_todo = previous = None
+    if changing and dialect.name == "postgresql":
+        old = select(*[getattr(Todo, field) for field in ("id",) + COUNTED_FIELDS]).where(
+            owned
+        ).with_for_update().subquery("old")
+        row = db.execute(
+            statement.where(Todo.id == old.c.id).returning(
+                Todo, *[old.c[field].label(f"old_{field}") for field in COUNTED_FIELDS]
+            ),
+            execution_options=options
+        ).first()
+        if row is None:
+            return None
+        db_todo = row[0]
+        previous = SimpleNamespace(**{field: row._mapping[f"old_{field}"] for field in COUNTED_FIELDS})
     
-    for field, value in update_data.items():
-        setattr(db_todo, field, value)
+    elif changing == ["completed"] and dialect.update_returning:
+        # Only matching rows whose flag flips means the old flag is known
+        db_todo = db.scalars(
+            statement.where(owned, Todo.completed != update_data["completed"]).returning(Todo),
+            execution_options=options
+        ).first()
+        if db_todo is not None:
+            previous = SimpleNamespace(
+                completed=not db_todo.completed, priority=db_todo.priority, category=db_todo.category
+            )
+    
+    if db_todo is None:
+        if changing:
+            previous = db.execute(
+                select(*[getattr(Todo, field) for field in COUNTED_FIELDS]).where(owned)
+            ).first()
+            if previous is None:
+                return None
+        if dialect.update_returning:
+            db_todo = db.scalars(statement.where(owned).returning(Todo), execution_options=options).first()
+        elif db.execute(statement.where(owned), execution_options=options).rowcount:
+            db_todo = get_todo(db, todo_id, user_id)
+        if db_todo is None:
+            return None
     
+    delta = {}
+    if changing:
+        delta = _counter_values(db_todo, 1)
+        for column, value in _counter_values(previous, -1).items():
+            delta[column] = delta.get(column, 0) + value
+        if settings.todo_counters_enabled:
+            _apply_counter_delta(db, user_id, delta)
+    
+    version = bump_data_version(db, user_id)
+    payload = _todo_payload(db_todo)
     db.commit()
-    db.refresh(db_todo)
+    _publish_change(user_id, version, "todo.updated", delta, todo=payload)
     return db_todo
 
 def delete_todo(db: Session, todo_id: int, user_id: int):
-    """Delete a todo"""
-    db_todo = get_todo(db, todo_id, user_id)
-    if not db_todo:
+    """Delete a todo with one owner-scoped DELETE ... RETURNING"""
+    owned = and_(Todo.id == todo_id, Todo.owner_id == user_id)
+    statement = delete(Todo).where(owned)
+    columns = [getattr(Todo, field) for field in COUNTED_FIELDS]
+    if db.get_bind().dialect.delete_returning:
+        deleted = db.execute(
+            statement.returning(*columns), execution_options={"synchronize_session": False}
+        ).first()
+    else:
+        deleted = db.execute(select(*columns).where(owned)).first()
+        if deleted is not None:
+            db.execute(statement, execution_options={"synchronize_session": False})
+    if deleted is None:
         return False
     
-    db.delete(db_todo)
+    delta = _counter_values(deleted, -1)
+    if settings.todo_counters_enabled:
+        _apply_counter_delta(db, user_id, delta)
+    version = bump_data_version(db, user_id)
     db.commit()
+    _publish_change(user_id, version, "todo.deleted", delta, id=todo_id)
     return True
 
-def get_todo_stats(db: Session, user_id: int):
-    """Get todo statistics for a user"""
-    total = db.query(Todo).filter(Todo.owner_id == user_id).count()
-    completed = db.query(Todo).filter(
-        and_(Todo.owner_id == user_id, Todo.completed == True)
-    ).count()
-    active = total - completed
-    
-    # Get overdue todos
-    today = datetime.now().date()
-    overdue = db.query(Todo).filter(
-        and_(
-            Todo.owner_id == user_id,
-            Todo.completed == False,
-            Todo.due_date < today
+def todo_export_query(user_id: int, fields: List[str]):
+    """Select the given columns of every todo a user owns, oldest first"""
+    return select(*[getattr(Todo, field) for field in fields]).where(
+        Todo.owner_id == user_id
+    ).order_by(Todo.id)
+
+# Batch todo operations
+def create_todos(db: Session, todos: List[TodoCreate], user_id: int):
+    """Create many todos with one bulk INSERT, returning their ids in order"""
+    if not todos:
+        return []
+    
+    # Imports may also carry completed/completed_at
+    rows = [
+        dict({"completed": False}, **todo.model_dump(), owner_id=user_id)
+        for todo in todos
+    ]
+    ids = db.scalars(
+        insert(Todo).returning(Todo.id, sort_by_parameter_order=True), rows
+    ).all()
+    
+    if settings.todo_counters_enabled:
+        _apply_counter_delta(db, user_id, _sum_counter_values(
+            SimpleNamespace(**row) for row in rows
+        ))
+    version = bump_data_version(db, user_id)
+    db.commit()
+    _publish_change(user_id, version, "todos.created", ids=list(ids))
+    return ids
+
+def update_todos(db: Session, updates: List[TodoBatchUpdateItem], user_id: int):
+    """Apply many partial updates in one transaction
+
+    Items with the same set of changed fields share one executemany
+    UPDATE. An id that appears again starts a new round of statements,
+    so repeated updates to one todo apply in request order. Returns the
+    set of ids that belonged to the user and were updated.
+    """
+    owned = _owned_todos(db, {item.id for item in updates}, user_id)
+    
+    now = datetime.utcnow()
+    rounds = [({}, set())]
+    # Counted fields of each todo as the updates leave it
+    current = {todo_id: dict(vars(row)) for todo_id, row in owned.items()}
+    for item in updates:
+        if item.id not in owned:
+            continue
+        values = item.model_dump(exclude_unset=True, exclude={"id"})
+        if not values:
+            continue
+        current[item.id].update({field: values[field] for field in COUNTED_FIELDS if field in values})
+        groups, ids = rounds[-1]
+        if item.id in ids:
+            groups, ids = {}, set()
+            rounds.append((groups, ids))
+        ids.add(item.id)
+        # The completed flag decides the completed_at expression, so it is
+        # part of the grouping key along with the field names
+        key = (tuple(sorted(values)), values.get("completed"))
+        groups.setdefault(key, []).append(dict({f"b_{k}": v for k, v in values.items()}, b_id=item.id))
+    
+    todos = Todo.__table__
+    for groups, _ in rounds:
+        for (fields, completed), params in groups.items():
+            statement = update(todos).where(todos.c.id == bindparam("b_id")).values(
+                {field: bindparam(f"b_{field}") for field in fields}
+            )
+            if completed:
+                statement = statement.values(completed_at=case(
+                    (todos.c.completed == False, now), else_=todos.c.completed_at
+                ))
+            elif "completed" in fields:
+                statement = statement.values(completed_at=None)
+            db.execute(statement, params)
+    
+    changed = bool(rounds[0][0])
+    if changed:
+        if settings.todo_counters_enabled:
+            delta = _sum_counter_values(owned.values(), -1)
+            for column, value in _sum_counter_values(
+                SimpleNamespace(**values) for values in current.values()
+            ).items():
+                delta[column] = delta.get(column, 0) + value
+            _apply_counter_delta(db, user_id, delta)
+        version = bump_data_version(db, user_id)
+    db.commit()
+    if changed:
+        updated = [item.id for item in updates if item.id in owned]
+        _publish_change(user_id, version, "todos.updated", ids=updated)
+    return set(owned)
+
+def delete_todos(db: Session, todo_ids: List[int], user_id: int):
+    """Delete many todos with one DELETE, returning the ids that were removed"""
+    owned = _owned_todos(db, set(todo_ids), user_id)
+    if owned:
+        db.execute(delete(Todo).where(Todo.id.in_(owned)), execution_options={"synchronize_session": False})
+        if settings.todo_counters_enabled:
+            _apply_counter_delta(db, user_id, _sum_counter_values(owned.values(), -1))
+        version = bump_data_version(db, user_id)
+    db.commit()
+    if owned:
+        _publish_change(user_id, version, "todos.deleted", ids=sorted(owned))
+    return set(owned)
+
+def _owned_todos(db: Session, todo_ids: set, user_id: int) -> dict:
+    """Map those of the given todo ids that belong to the user to their counted fields"""
+    if not todo_ids:
+        return {}
+    rows = db.execute(
+        select(Todo.id, *[getattr(Todo, field) for field in COUNTED_FIELDS]).where(
+            Todo.owner_id == user_id, Todo.id.in_(todo_ids)
         )
-    ).count()
-    
-    # Get todos due today
-    due_today = db.query(Todo).filter(
-        and_(
-            Todo.owner_id == user_id,
-            Todo.completed == False,
-            func.date(Todo.due_date) == today
+    )
+    return {row.id: SimpleNamespace(**{field: getattr(row, field) for field in COUNTED_FIELDS}) for row in rows}
+
+def apply_todo_action(db: Session, todo_filter: TodoFilter, action: str, user_id: int) -> int:
+    """Complete, reopen or delete every todo matching a filter in one statement
+
+    Rows are never loaded into Python. Returns the number of todos affected.
+    """
+    conditions = [Todo.owner_id == user_id]
+    if todo_filter.category:
+        conditions.append(Todo.category == todo_filter.category)
+    if todo_filter.priority:
+        conditions.append(Todo.priority == todo_filter.priority)
+    if todo_filter.completed is not None:
+        conditions.append(Todo.completed == todo_filter.completed)
+    
+    if action == "complete":
+        statement = update(Todo).where(*conditions, Todo.completed == False).values(
+            completed=True, completed_at=datetime.utcnow()
+        )
+    elif action == "reopen":
+        statement = update(Todo).where(*conditions, Todo.completed == True).values(
+            completed=False, completed_at=None
         )
-    ).count()
-    
-    # Get stats by priority
-    priority_stats = {}
-    for priority in PriorityLevel:
-        count = db.query(Todo).filter(
-            and_(Todo.owner_id == user_id, Todo.priority == priority)
-        ).count()
-        priority_stats[priority.value] = count
-    
-    # Get stats by category
-    category_stats = {}
-    for category in CategoryType:
-        count = db.query(Todo).filter(
-            and_(Todo.owner_id == user_id, Todo.category == category)
-        ).count()
-        category_stats[category.value] = count
+    elif action == "delete":
+        statement = delete(Todo).where(*conditions)
+    else:
+        raise ValueError(f"Unknown action: {action}")
+    
+    if action == "delete" and settings.todo_counters_enabled:
+        # Deleted rows take their priority and category counts with them
+        delta = {column: -count for column, count in _count_todos(db, *conditions).items()}
+    affected = db.execute(statement, execution_options={"synchronize_session": False}).rowcount
+    if affected:
+        if settings.todo_counters_enabled:
+            if action != "delete":
+                # Only the completed flag changed, on exactly the affected rows
+                delta = {"completed": affected if action == "complete" else -affected}
+            _apply_counter_delta(db, user_id, delta)
+        version = bump_data_version(db, user_id)
+    db.commit()
+    if affected:
+        # Rows were never loaded, so subscribers only learn the filter
+        _publish_change(
+            user_id, version, "todos.changed",
+            action=action, filter=todo_filter.model_dump(mode="json", exclude_none=True)
+        )
+    return affected
+
+# Archive tiering
+def archive_completed_todos(db: Session, completed_before: datetime, batch_size: int) -> int:
+    """Move one batch of todos finished before a cutoff into the archive
+
+    A todo qualifies once it was both completed and last changed before the
+    cutoff, so a restored todo stays hot for another period. Returns how
+    many todos moved; keep calling until fewer than batch_size do.
+    """
+    rows = db.execute(
+        select(Todo.id, Todo.owner_id).where(
+            Todo.completed == True,
+            Todo.completed_at < completed_before,
+            or_(Todo.updated_at.is_(None), Todo.updated_at < completed_before)
+        ).order_by(Todo.completed_at).limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+    
+    _move_todos(db, Todo, ArchivedTodo, [row.id for row in rows])
+    _commit_moved_todos(db, rows, "todos.archived")
+    return len(rows)
+
+def restore_todos(db: Session, todo_ids: List[int], user_id: int) -> set:
+    """Move a user's archived todos back into the hot table, returning their ids"""
+    if not todo_ids:
+        return set()
+    rows = db.execute(
+        select(ArchivedTodo.id, ArchivedTodo.owner_id).where(
+            ArchivedTodo.owner_id == user_id, ArchivedTodo.id.in_(set(todo_ids))
+        )
+    ).all()
+    if rows:
+        _move_todos(db, ArchivedTodo, Todo, [row.id for row in rows])
+        _commit_moved_todos(db, rows, "todos.restored")
+    return {row.id for row in rows}
+
+def _move_todos(db: Session, source, target, todo_ids: List[int]):
+    """Copy todos between the hot and archive tables, then delete the originals"""
+    columns = [column.name for column in Todo.__table__.columns]
+    # Restoring counts as a change, which restarts the archive clock
+    values = [
+        func.now() if column == "updated_at" and target is Todo else getattr(source, column)
+        for column in columns
+    ]
+    db.execute(
+        insert(target).from_select(columns, select(*values).where(source.id.in_(todo_ids)))
+    )
+    db.execute(
+        delete(source).where(source.id.in_(todo_ids)),
+        execution_options={"synchronize_session": False}
+    )
+
+def _commit_moved_todos(db: Session, rows, event_type: str):
+    """Bump the owners' versions and counters for moved todos, then commit"""
+    moved = {}
+    for row in rows:
+        moved.setdefault(row.owner_id, []).append(row.id)
+    
+    versions = {}
+    for owner_id in moved:
+        if settings.todo_counters_enabled:
+            rebuild_todo_counters(db, owner_id)
+        versions[owner_id] = bump_data_version(db, owner_id)
+    db.commit()
+    for owner_id, ids in moved.items():
+        _publish_change(owner_id, versions[owner_id], event_type, ids=sorted(ids))
+
+# Per-user data versions
+def get_data_version(db: Session, user_id: int) -> Tuple[int, Optional[datetime]]:
+    """Return a user's (version, updated_at); 0 if their todos never changed"""
+    row = db.query(DataVersion.version, DataVersion.updated_at).filter(
+        DataVersion.owner_id == user_id
+    ).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+def bump_data_version(db: Session, user_id: int) -> int:
+    """Increment a user's data version inside the current transaction"""
+    now = datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        # One upsert statement, safe against concurrent first writes
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = dialect_insert(DataVersion).values(owner_id=user_id, version=1, updated_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[DataVersion.owner_id],
+            set_={"version": DataVersion.version + 1, "updated_at": now}
+        ).returning(DataVersion.version)
+        return db.execute(statement).scalar_one()
+    
+    updated = db.query(DataVersion).filter(DataVersion.owner_id == user_id).update(
+        {DataVersion.version: DataVersion.version + 1, DataVersion.updated_at: now},
+        synchronize_session=False
+    )
+    if not updated:
+        db.add(DataVersion(owner_id=user_id, version=1, updated_at=now))
+        return 1
+    return get_data_version(db, user_id)[0]
+
+def _publish_change(user_id: int, version: int, event_type: str, stats_delta: Optional[dict] = None, **payload):
+    """Publish a committed change to the user's change feed
+
+    stats_delta holds counter changes from _counter_values; without one,
+    subscribers should refetch the stats.
+    """
+    event = {"type": event_type, "version": version, **payload}
+    if stats_delta is not None:
+        by_priority = {p.value: stats_delta.get(f"priority_{p.value}", 0) for p in PriorityLevel}
+        by_category = {c.value: stats_delta.get(f"category_{c.value}", 0) for c in CategoryType}
+        total = stats_delta.get("total", 0)
+        completed = stats_delta.get("completed", 0)
+        event["stats_delta"] = {
+            "total": total,
+            "completed": completed,
+            "active": total - completed,
+            "by_priority": {key: value for key, value in by_priority.items() if value},
+            "by_category": {key: value for key, value in by_category.items() if value},
+        }
+    events.publish(user_id, event)
+
+def _todo_payload(todo: Todo) -> dict:
+    """Serialize a todo the way the API returns it"""
+    return TodoResponse.model_validate(todo).model_dump(mode="json")
+
+def get_todo_stats(db: Session, user_id: int, include_archived: bool = False):
+    """Get todo statistics for a user, optionally counting archived todos"""
+    if settings.todo_counters_enabled:
+        stats = _get_todo_stats_from_counters(db, user_id)
+    else:
+        stats = _get_todo_stats(db, user_id)
+    if include_archived:
+        _add_archived_stats(db, user_id, stats)
+    return stats
+
+def _get_todo_stats(db: Session, user_id: int):
+    """Get todo statistics from the todos table"""
+    # Count everything in a single conditional-aggregate pass
+    today_start, tomorrow_start = _today_bounds()
+    open_with_due = and_(Todo.completed == False, Todo.due_date.isnot(None))
+    columns = [
+        func.count(Todo.id),
+        _count_where(Todo.completed == True),
+        _count_where(and_(open_with_due, Todo.due_date < today_start)),
+        _count_where(and_(
+            open_with_due,
+            Todo.due_date >= today_start,
+            Todo.due_date < tomorrow_start
+        )),
+    ]
+    columns += [_count_where(Todo.priority == priority) for priority in PriorityLevel]
+    columns += [_count_where(Todo.category == category) for category in CategoryType]
+    
+    row = db.query(*columns).filter(Todo.owner_id == user_id).one()
+    total, completed, overdue, due_today = row[:4]
+    priority_counts = row[4:4 + len(PriorityLevel)]
+    category_counts = row[4 + len(PriorityLevel):]
     
     return {
         "total": total,
         "completed": completed,
-        "active": active,
+        "active": total - completed,
+        "overdue": overdue,
+        "due_today": due_today,
+        "by_priority": {
+            priority.value: count for priority, count in zip(PriorityLevel, priority_counts)
+        },
+        "by_category": {
+            category.value: count for category, count in zip(CategoryType, category_counts)
+        }
+    }
+
+def _add_archived_stats(db: Session, user_id: int, stats: dict):
+    """Add a user's archived todos, which are all completed, to their stats"""
+    columns = [func.count(ArchivedTodo.id)]
+    columns += [_count_where(ArchivedTodo.priority == priority) for priority in PriorityLevel]
+    columns += [_count_where(ArchivedTodo.category == category) for category in CategoryType]
+    
+    row = db.query(*columns).filter(ArchivedTodo.owner_id == user_id).one()
+    stats["total"] += row[0]
+    stats["completed"] += row[0]
+    for priority, count in zip(PriorityLevel, row[1:1 + len(PriorityLevel)]):
+        stats["by_priority"][priority.value] += count
+    for category, count in zip(CategoryType, row[1 + len(PriorityLevel):]):
+        stats["by_category"][category.value] += count
+
+def _count_where(condition):
+    """Count the rows matching a condition inside an aggregate query"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def _today_bounds():
+    """Return the start of today and tomorrow as naive datetimes"""
+    today_start = datetime.combine(datetime.now().date(), time.min)
+    return today_start, today_start + timedelta(days=1)
+
+# Due-date agenda
+AGENDA_MAX_DAYS = 92
+
+def agenda_bounds(start: date, end: date, zone: tzinfo) -> List[datetime]:
+    """UTC instants of local midnight on each day from start through end"""
+    days = (end - start).days
+    return [
+        datetime.combine(start + timedelta(days=offset), time.min, tzinfo=zone).astimezone(timezone.utc)
+        for offset in range(days + 1)
+    ]
+
+def get_todo_agenda(
+    db: Session,
+    user_id: int,
+    start: date,
+    end: date,
+    zone: tzinfo,
+    completed: Optional[bool] = False,
+    limit: int = 500
+):
+    """Todos due from start up to end, with counts per local day and week
+
+    Days run from midnight to midnight in zone, which can be any length
+    across a DST change. Both queries are plain ranges on due_date, served
+    by the (owner_id, completed, due_date) index; the counts never read
+    the todo rows themselves.
+    """
+    bounds = agenda_bounds(start, end, zone)
+    in_range = [
+        Todo.owner_id == user_id,
+        # IN keeps the completed column usable for the range that follows it
+        Todo.completed.in_([False, True] if completed is None else [completed]),
+        Todo.due_date >= bounds[0],
+        Todo.due_date < bounds[-1],
+    ]
+    bucket = case(
+        *[(Todo.due_date < bound, index) for index, bound in enumerate(bounds[1:])]
+    ).label("bucket")
+    
+    day_counts = [0] * (len(bounds) - 1)
+    for index, count in db.execute(select(bucket, func.count()).where(*in_range).group_by(bucket)):
+        day_counts[index] = count
+    
+    todos = db.scalars(
+        select(Todo).where(*in_range).order_by(Todo.due_date, Todo.id).limit(limit)
+    ).all()
+    
+    days = [
+        {"date": start + timedelta(days=offset), "count": count}
+        for offset, count in enumerate(day_counts)
+    ]
+    weeks = {}
+    for day in days:
+        # ISO weeks, starting on Monday
+        week_start = day["date"] - timedelta(days=day["date"].weekday())
+        weeks[week_start] = weeks.get(week_start, 0) + day["count"]
+    
+    return {
+        "start": start,
+        "end": end,
+        "total": sum(day_counts),
+        "days": days,
+        "weeks": [{"week_start": week_start, "count": count} for week_start, count in weeks.items()],
+        "todos": todos,
+    }
+
+# Todo counter maintenance
+def _counter_values(todo: Todo, sign: int) -> dict:
+    """Return the counter columns a todo contributes to, scaled by sign"""
+    priority = PriorityLevel(todo.priority or PriorityLevel.MEDIUM)
+    category = CategoryType(todo.category or CategoryType.PERSONAL)
+    values = {
+        "total": sign,
+        f"priority_{priority.value}": sign,
+        f"category_{category.value}": sign,
+    }
+    if todo.completed:
+        values["completed"] = sign
+    return values
+
+def _sum_counter_values(todos, sign: int = 1) -> dict:
+    """Add up the counter columns several todos contribute to"""
+    delta = {}
+    for todo in todos:
+        for column, value in _counter_values(todo, sign).items():
+            delta[column] = delta.get(column, 0) + value
+    return delta
+
+def _apply_counter_delta(db: Session, user_id: int, delta: dict):
+    """Add a delta to a user's counters inside the current transaction"""
+    delta = {column: value for column, value in delta.items() if value}
+    if not delta:
+        return
+    
+    updated = db.query(TodoCounter).filter(TodoCounter.owner_id == user_id).update(
+        {
+            getattr(TodoCounter, column): getattr(TodoCounter, column) + value
+            for column, value in delta.items()
+        },
+        synchronize_session=False
+    )
+    if not updated:
+        # No counters yet: build them from the (already flushed) todos
+        rebuild_todo_counters(db, user_id)
+
+def _count_todos(db: Session, *conditions) -> dict:
+    """Count the todos matching conditions into counter columns with one grouped query"""
+    counts = {column.name: 0 for column in TodoCounter.__table__.columns if column.name != "owner_id"}
+    rows = db.query(
+        Todo.completed, Todo.priority, Todo.category, func.count(Todo.id)
+    ).filter(*conditions).group_by(
+        Todo.completed, Todo.priority, Todo.category
+    ).all()
+    
+    for completed, priority, category, count in rows:
+        counts["total"] += count
+        counts[f"priority_{PriorityLevel(priority).value}"] += count
+        counts[f"category_{CategoryType(category).value}"] += count
+        if completed:
+            counts["completed"] += count
+    return counts
+
+def rebuild_todo_counters(db: Session, user_id: int) -> TodoCounter:
+    """Recompute a user's counters from their todos without committing"""
+    db.flush()
+    counter = db.get(TodoCounter, user_id)
+    if counter is None:
+        counter = TodoCounter(owner_id=user_id)
+        db.add(counter)
+    
+    for column, value in _count_todos(db, Todo.owner_id == user_id).items():
+        setattr(counter, column, value)
+    db.flush()
+    return counter
+
+def verify_todo_counters(db: Session, user_id: int) -> dict:
+    """Compare a user's counters against their todos and return any drift"""
+    counter = db.get(TodoCounter, user_id)
+    if counter is None:
+        # Missing counters are built lazily on first use, so they can't drift
+        return {}
+    
+    drift = {}
+    for column, expected in _count_todos(db, Todo.owner_id == user_id).items():
+        stored = getattr(counter, column)
+        if stored != expected:
+            drift[column] = {"stored": stored, "actual": expected}
+    return drift
+
+def _get_todo_stats_from_counters(db: Session, user_id: int):
+    """Get todo statistics from the counters table
+
+    Missing counters are built on first use, except on a read replica,
+    which can't be written: there the stats come from the todos table.
+    """
+    counter = db.get(TodoCounter, user_id)
+    if counter is None:
+        if db.info.get("read_only"):
+            return _get_todo_stats(db, user_id)
+        counter = rebuild_todo_counters(db, user_id)
+        db.commit()
+    
+    # Due-date counts depend on the current day, so they can't be stored
+    today_start, tomorrow_start = _today_bounds()
+    overdue, due_today = db.query(
+        _count_where(Todo.due_date < today_start),
+        _count_where(Todo.due_date >= today_start)
+    ).filter(
+        Todo.owner_id == user_id,
+        Todo.completed == False,
+        Todo.due_date.isnot(None),
+        Todo.due_date < tomorrow_start
+    ).one()
+    
+    return {
+        "total": counter.total,
+        "completed": counter.completed,
+        "active": counter.total - counter.completed,
         "overdue": overdue,
         "due_today": due_today,
-        "by_priority": priority_stats,
-        "by_category": category_stats
+        "by_priority": {
+            priority.value: getattr(counter, f"priority_{priority.value}")
+            for priority in PriorityLevel
+        },
+        "by_category": {
+            category.value: getattr(counter, f"category_{category.value}")
+            for category in CategoryType
+        }
     }
@@ -1,24 +1,134 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-load_dotenv()
+from config import settings
+import metrics
 
 # Database configuration
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./todos.db")
+DATABASE_URL = settings.database_url
+DATABASE_READ_URL = settings.database_read_url
+
+# Async drivers for each database, used by the request-serving engines
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_url(url: str) -> str:
+    """Return the URL with its driver swapped for the async equivalent"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+class _TimedCheckout:
+    """Pool mixin reporting how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            metrics.record_checkout(time.perf_counter() - started, timed_out=True)
+            raise
+        metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
 
-# For SQLite, we need to add check_same_thread=False
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False}
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Build create_engine keyword arguments from the settings"""
+    parsed = make_url(url)
+    options = {"query_cache_size": settings.db_query_cache_size}
+    connect_args = {}
+
+    if _is_sqlite(url):
+        # For SQLite, we need to add check_same_thread=False
+        connect_args["check_same_thread"] = False
+        if parsed.database in (None, "", ":memory:"):
+            # In-memory databases use a single shared connection, not a pool
+            return dict(options, connect_args=connect_args)
+    elif is_async and parsed.get_backend_name() == "postgresql":
+        connect_args["prepared_statement_cache_size"] = settings.db_prepared_statement_cache_size
+
+    # Queue pools that account checkout waits; aiosqlite would otherwise
+    # default to opening a connection per checkout
+    options.update(
+        poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        connect_args=connect_args,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
     )
-else:
-    # For PostgreSQL or other databases
-    engine = create_engine(DATABASE_URL)
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection for concurrent readers and writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}")
+    cursor.close()
+
+def build_engine(url: str):
+    """Create a sync engine with the configured pool and pragmas"""
+    engine = create_engine(url, **engine_options(url))
+    if _is_sqlite(url):
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+def build_async_engine(url: str):
+    """Create an async engine with the configured pool and pragmas"""
+    engine = create_async_engine(async_url(url), **engine_options(url, is_async=True))
+    if _is_sqlite(url):
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+engine = build_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the API routes, so queries don't block the event loop
+async_engine = build_async_engine(DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Read-only routes use the replica when one is configured
+if DATABASE_READ_URL:
+    async_read_engine = build_async_engine(DATABASE_READ_URL)
+    AsyncReadSessionLocal = async_sessionmaker(
+        async_read_engine, autoflush=False, expire_on_commit=False, info={"read_only": True}
+    )
+else:
+    async_read_engine = async_engine
+    AsyncReadSessionLocal = AsyncSessionLocal
+
+async def get_db():
+    """Request-scoped session on the primary database
+
+    FastAPI resolves a dependency once per request, so authentication and
+    the route handler share this session and its one pooled connection.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
 Base = declarative_base()
@@ -0,0 +1,132 @@
+"""
+Todo change events and the pub/sub hub that fans them out
+
+crud publishes an event after every committed change to a user's todos.
+Each event carries the user's new data version, so a client that
+reconnects with the last version it saw can be replayed what it missed.
+
+The default hub keeps subscribers and a short replay buffer in process.
+Deployments with several workers can install a cross-worker backend with
+set_hub(); it only has to implement the EventHub interface.
+"""
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set
+
+from config import settings
+
+class Subscription:
+    """A subscriber's event queue, bound to the loop that reads it"""
+
+    def __init__(self, user_id: int, maxsize: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event: dict):
+        """Queue an event; a subscriber that falls behind is told to resync"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "version": event.get("version")})
+
+class EventHub:
+    """Interface for publishing and subscribing to per-user events"""
+
+    def publish(self, user_id: int, event: dict):
+        """Send an event to every subscriber of a user; callable from any thread"""
+        raise NotImplementedError
+
+    def subscribe(self, user_id: int):
+        """Async context manager yielding a Subscription for a user"""
+        raise NotImplementedError
+
+    def replay(self, user_id: int, since: int) -> Optional[List[dict]]:
+        """Return the events after a version, or None if they are not all known"""
+        raise NotImplementedError
+
+class InProcessHub(EventHub):
+    """Hub for a single worker process
+
+    Replay history is kept for the most recently active users only.
+    """
+
+    def __init__(self, queue_size: int, replay_size: int, replay_users: int = 10000):
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self.replay_users = replay_users
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._recent: "OrderedDict[int, deque]" = OrderedDict()
+
+    def publish(self, user_id: int, event: dict):
+        recent = self._recent.get(user_id)
+        if recent is None:
+            recent = self._recent[user_id] = deque(maxlen=self.replay_size)
+            if len(self._recent) > self.replay_users:
+                self._recent.popitem(last=False)
+        self._recent.move_to_end(user_id)
+        recent.append(event)
+
+        for subscription in list(self._subscribers.get(user_id, ())):
+            # Hand over to the subscriber's loop; crud may run on another thread
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[Subscription]:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def replay(self, user_id: int, since: int) -> Optional[List[dict]]:
+        events = [event for event in self._recent.get(user_id, ()) if event["version"] > since]
+        if events and events[0]["version"] != since + 1:
+            return None
+        return events
+
+hub: EventHub = InProcessHub(settings.event_queue_size, settings.event_replay_size)
+
+def set_hub(new_hub: EventHub):
+    """Replace the hub, e.g. with a cross-worker backend"""
+    global hub
+    hub = new_hub
+
+# Called in this worker with (user_id, event) for every published event
+_listeners: List[Callable[[int, dict], None]] = []
+
+def add_listener(listener: Callable[[int, dict], None]):
+    """Run a callback for every event published by this worker"""
+    _listeners.append(listener)
+
+# Events held back until the transaction that produced them commits
+_deferred: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("deferred_events", default=None)
+
+def publish(user_id: int, event: dict):
+    """Publish an event through the current hub, or hold it inside deferred()"""
+    pending = _deferred.get()
+    if pending is not None:
+        pending.append((user_id, event))
+        return
+    for listener in _listeners:
+        listener(user_id, event)
+    hub.publish(user_id, event)
+
+@contextmanager
+def deferred() -> Iterator[List[tuple]]:
+    """Collect the (user_id, event) pairs published in this context instead"""
+    pending: List[tuple] = []
+    token = _deferred.set(pending)
+    try:
+        yield pending
+    finally:
+        _deferred.reset(token)
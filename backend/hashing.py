@@ -0,0 +1,80 @@
+"""
+Password hashing off the event loop
+
+bcrypt is deliberately slow, so hashing and verification run on a small
+thread pool (bcrypt releases the GIL). Work beyond the pool size waits in
+a bounded queue; once that is full, callers get PasswordHashingBusy
+straight away instead of piling up behind each other.
+
+The one CryptContext shared by the app is built on first use, so passlib
+isn't imported until a password is hashed or checked.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from config import settings
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing pool and its queue are full"""
+
+def build_context(rounds: int) -> "CryptContext":
+    """Build a bcrypt context that flags hashes made with any other cost"""
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+_context: Optional["CryptContext"] = None
+
+def get_context() -> "CryptContext":
+    """Return the app's password context, building it on first use"""
+    global _context
+    if _context is None:
+        _context = build_context(settings.bcrypt_rounds)
+    return _context
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending = 0
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(settings.password_hash_workers, 1),
+            thread_name_prefix="password-hash",
+        )
+    return _executor
+
+async def _run(func, *args):
+    """Run a hashing call on the pool, shedding it if the queue is full"""
+    global _pending
+    if _pending >= settings.password_hash_workers + settings.password_hash_queue_depth:
+        raise PasswordHashingBusy()
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password(password: str) -> str:
+    """Hash a password"""
+    return await _run(get_context().hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password, returning (valid, new_hash)
+
+    new_hash is set when the stored hash should be replaced, e.g. because
+    the configured bcrypt cost has changed since it was created.
+    """
+    return await _run(get_context().verify_and_update, plain_password, hashed_password)
@@ -1,21 +1,62 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from typing import List, Optional
-import uvicorn
-from datetime import datetime
-
-from database import SessionLocal, engine
-from models import Base, Todo, User
-from schemas import TodoCreate, TodoUpdate, TodoResponse, UserCreate, UserResponse
-from auth import get_current_user, create_access_token, verify_password
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+import asyncio
+from datetime import datetime, date, timezone
+from email.utils import format_datetime
+from contextlib import asynccontextmanager
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from config import settings
+from database import AsyncSessionLocal, async_engine, async_read_engine, get_db
+from models import Todo, User
+from schemas import (
+    TodoCreate, TodoUpdate, TodoResponse, UserCreate, UserResponse,
+    TodoBatchCreate, TodoBatchUpdate, TodoBatchDelete, TodoBatchRestore, TodoBatchResponse,
+    TodoBatchWhere, TodoBatchWhereResponse, TodoImportResponse, TodoAgenda
+)
+from auth import get_current_user, authenticate_token, create_access_token
 import crud
+import admission
+import archive
+import async_crud
+import events
+import hashing
+import metrics
+import result_cache
+import serialization
+import shards
+import transfer
+import writes
+
+# Count and time SQL statements on every engine
+if settings.metrics_enabled:
+    for instrumented in {async_read_engine}.union(
+        *({shard.engine, shard.async_engine} for shard in shards.router.shards)
+    ):
+        metrics.instrument_engine(instrumented)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run background archiving, and close pooled connections on shutdown"""
+    compaction = None
+    if settings.archive_enabled:
+        compaction = asyncio.create_task(archive.run_periodically())
+    yield
+    if compaction is not None:
+        compaction.cancel()
+    await writes.close()
+    for shard in shards.router.shards:
+        await shard.async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
 
 app = FastAPI(
+    lifespan=lifespan,
+    dependencies=[Depends(admission.admit)],
     title="Todo API",
     description="A modern Todo application with user authentication",
     version="2.0.0"
@@ -28,17 +69,97 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
+if settings.metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 security = HTTPBearer()
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+@app.exception_handler(hashing.PasswordHashingBusy)
+@app.exception_handler(writes.WriteQueueFull)
+async def server_busy_handler(request: Request, exc: Exception):
+    """Shed requests quickly while the hashing pool or a write queue is full"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(admission.Throttled)
+async def throttled_handler(request: Request, exc: admission.Throttled):
+    """Refuse requests over a rate limit (429) or while overloaded (503)"""
+    detail = "Too many requests" if exc.status_code == 429 else "Server is busy, please retry shortly"
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# Todo routes use the shard holding the current user's todos. On the
+# primary that is the request's own session, the one auth already used.
+async def get_user_db(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    shard = await shards.router.resolve(current_user.id, db)
+    if shard.AsyncSessionLocal is AsyncSessionLocal:
         yield db
-    finally:
-        db.close()
+    else:
+        async with shard.AsyncSessionLocal() as shard_db:
+            yield shard_db
+
+# Read-only routes use the replica when DATABASE_READ_URL is set
+async def get_user_read_db(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    shard = await shards.router.resolve(current_user.id, db)
+    if shard.AsyncReadSessionLocal is AsyncSessionLocal:
+        yield db
+    else:
+        async with shard.AsyncReadSessionLocal() as read_db:
+            yield read_db
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    opaque = etag.removeprefix("W/")
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or opaque in candidates
+
+async def not_modified(
+    request: Request, response: Response, db: AsyncSession, user_id: int, *extra
+) -> Optional[Response]:
+    """Validate a conditional GET against the user's data version
+
+    Sets ETag and Last-Modified on the response and returns a 304 to send
+    instead when the client's copy is current. Only the small
+    data_versions row is read, never the todos table.
+    """
+    version, updated_at = await async_crud.get_data_version(db, user_id)
+    tag = ".".join(str(part) for part in (user_id, version, *extra))
+    headers = {"ETag": f'W/"{tag}"', "Cache-Control": "private, no-cache"}
+    if updated_at is not None:
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    response.headers.update(headers)
+    return None
+
+def sparse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a ?fields= sparse fieldset, None meaning the full todo"""
+    if fields is None:
+        return None
+    try:
+        return serialization.parse_fields(fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
 @app.get("/")
 async def root():
@@ -49,34 +170,50 @@ async def root():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Request and database metrics in the Prometheus text format"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = crud.get_user_by_email(db, email=user.email)
+    existing_user = await async_crud.get_user_by_email(db, email=user.email)
     if existing_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
-    # Create new user
-    db_user = crud.create_user(db=db, user=user)
+    # Create new user, hashing the password off the event loop
+    hashed_password = await hashing.hash_password(user.password)
+    db_user = await async_crud.create_user(db=db, user=user, hashed_password=hashed_password)
+    await shards.router.place_new_user(db, db_user)
     return db_user
 
 @app.post("/auth/login")
-async def login(email: str, password: str, db: Session = Depends(get_db)):
+async def login(request: Request, email: str, password: str, db: AsyncSession = Depends(get_db)):
     """Login user and return access token"""
-    user = crud.get_user_by_email(db, email=email)
-    if not user or not verify_password(password, user.hashed_password):
+    admission.admit_login(request, email)
+    user = await async_crud.get_user_by_email(db, email=email)
+    if user:
+        valid, new_hash = await hashing.verify_password(password, user.hashed_password)
+    if not user or not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(data={"sub": user.email})
+    # Upgrade hashes made with a different bcrypt cost
+    if new_hash:
+        await async_crud.update_user_password_hash(db, user, new_hash)
+    
+    access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -95,47 +232,255 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 # Todo endpoints
 @app.get("/todos", response_model=List[TodoResponse])
 async def get_todos(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
     priority: Optional[str] = None,
     completed: Optional[bool] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    """Get all todos for the current user with optional filtering"""
-    todos = crud.get_todos(
-        db=db,
-        user_id=current_user.id,
-        skip=skip,
-        limit=limit,
-        category=category,
-        priority=priority,
-        completed=completed,
-        search=search
-    )
+    """Get all todos for the current user with optional filtering
+
+    Full pages in chronological order carry an X-Next-Cursor header; pass
+    it back as `cursor` to fetch the next page without a deep offset.
+    Searches without a cursor are ranked by relevance instead. Pass
+    `fields` (e.g. id,title,completed) to receive only those keys, and
+    `include_archived` to also list archived todos.
+    """
+    requested = sparse_fields(fields)
+    cached = await not_modified(request, response, db, current_user.id)
+    if cached:
+        return cached
+    
+    cache_key = None
+    if settings.result_cache_enabled:
+        # The ETag carries the user's data version
+        cache_key = result_cache.cache.key(current_user.id, response.headers["ETag"], {
+            "skip": skip, "limit": limit, "category": category, "priority": priority,
+            "completed": completed, "search": search, "cursor": cursor,
+            "fields": requested, "include_archived": include_archived,
+        })
+        page = result_cache.cache.get(cache_key)
+        if page is not None:
+            body, next_cursor = page
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return Response(body, media_type="application/json", headers=dict(response.headers))
+    
+    # Sparse, fast and cached responses select plain rows of just the
+    # response columns, plus what the next cursor needs
+    columns = requested
+    if not columns and (settings.fast_todo_serialization or cache_key):
+        columns = serialization.TODO_FIELDS
+    if columns:
+        columns = columns + [column for column in ("created_at", "id") if column not in columns]
+    try:
+        todos = await async_crud.get_todos(
+            db=db,
+            user_id=current_user.id,
+            skip=skip,
+            limit=limit,
+            category=category,
+            priority=priority,
+            completed=completed,
+            search=search,
+            cursor=cursor,
+            columns=columns,
+            include_archived=include_archived
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if todos and len(todos) == limit and (cursor or not search or include_archived):
+        response.headers["X-Next-Cursor"] = crud.encode_todo_cursor(todos[-1])
+    if columns:
+        body = serialization.todo_rows_json(todos, requested or serialization.TODO_FIELDS)
+        if cache_key:
+            result_cache.cache.set(cache_key, body, response.headers.get("X-Next-Cursor"))
+        return Response(body, media_type="application/json", headers=dict(response.headers))
     return todos
 
 @app.post("/todos", response_model=TodoResponse)
 async def create_todo(
     todo: TodoCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_db)
 ):
     """Create a new todo"""
-    return crud.create_todo(db=db, todo=todo, user_id=current_user.id)
+    return await async_crud.create_todo(db=db, todo=todo, user_id=current_user.id)
+
+# Batch endpoints: each request runs in a single transaction
+@app.post("/todos/batch", response_model=TodoBatchResponse)
+async def create_todos(
+    batch: TodoBatchCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_db)
+):
+    """Create many todos at once"""
+    ids = await async_crud.create_todos(db=db, todos=batch.todos, user_id=current_user.id)
+    return {
+        "results": [
+            {"index": index, "id": todo_id, "status": "created"}
+            for index, todo_id in enumerate(ids)
+        ]
+    }
+
+@app.patch("/todos/batch", response_model=TodoBatchResponse)
+async def update_todos(
+    batch: TodoBatchUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_db)
+):
+    """Update many todos at once"""
+    updated = await async_crud.update_todos(db=db, updates=batch.updates, user_id=current_user.id)
+    return {
+        "results": [
+            {"index": index, "id": item.id, "status": "updated" if item.id in updated else "not_found"}
+            for index, item in enumerate(batch.updates)
+        ]
+    }
+
+@app.post("/todos/batch/delete", response_model=TodoBatchResponse)
+async def delete_todos(
+    batch: TodoBatchDelete,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_db)
+):
+    """Delete many todos at once"""
+    deleted = await async_crud.delete_todos(db=db, todo_ids=batch.ids, user_id=current_user.id)
+    return {
+        "results": [
+            {"index": index, "id": todo_id, "status": "deleted" if todo_id in deleted else "not_found"}
+            for index, todo_id in enumerate(batch.ids)
+        ]
+    }
+
+@app.post("/todos/batch/where", response_model=TodoBatchWhereResponse)
+async def apply_todo_action(
+    batch: TodoBatchWhere,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_db)
+):
+    """Complete, reopen or delete every todo matching a filter"""
+    affected = await async_crud.apply_todo_action(
+        db=db,
+        todo_filter=batch.filter,
+        action=batch.action,
+        user_id=current_user.id
+    )
+    return {"affected": affected}
+
+@app.post("/todos/restore", response_model=TodoBatchResponse)
+async def restore_todos(
+    batch: TodoBatchRestore,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_db)
+):
+    """Move archived todos back into the active list"""
+    restored = await async_crud.restore_todos(db=db, todo_ids=batch.ids, user_id=current_user.id)
+    return {
+        "results": [
+            {"index": index, "id": todo_id, "status": "restored" if todo_id in restored else "not_found"}
+            for index, todo_id in enumerate(batch.ids)
+        ]
+    }
+
+# Export and import
+@app.get("/todos/export")
+async def export_todos(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: User = Depends(get_current_user)
+):
+    """Stream all of the current user's todos as NDJSON or CSV"""
+    return StreamingResponse(
+        transfer.export_todos(current_user.id, format),
+        media_type=transfer.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="todos.{format}"'},
+    )
+
+@app.post("/todos/import", response_model=TodoImportResponse)
+async def import_todos(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_db)
+):
+    """Import todos from an NDJSON or CSV request body"""
+    return await transfer.import_todos(db, request.stream(), format, current_user.id)
+
+# Due-date agenda
+@app.get("/todos/agenda", response_model=TodoAgenda)
+async def get_todo_agenda(
+    request: Request,
+    response: Response,
+    start: date,
+    end: date,
+    tz: str = "UTC",
+    todo_status: Literal["open", "done", "all"] = Query("open", alias="status"),
+    limit: int = 500,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_read_db)
+):
+    """Todos due from `start` up to (not including) `end`, with counts
+
+    Days begin at midnight in the client's IANA time zone `tz`, so a
+    calendar view gets its per-day and per-week counts and the todos to
+    show from one request. `status` picks open todos (the default), done
+    ones, or all of them. At most `limit` todos are listed, soonest due
+    first, while the counts cover the whole range.
+    """
+    try:
+        zone = ZoneInfo(tz)
+    except (ValueError, ZoneInfoNotFoundError):
+        raise HTTPException(status_code=400, detail=f"Unknown time zone: {tz}")
+    if not 0 < (end - start).days <= crud.AGENDA_MAX_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"end must be 1 to {crud.AGENDA_MAX_DAYS} days after start"
+        )
+    if not 0 < limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    
+    cached = await not_modified(request, response, db, current_user.id)
+    if cached:
+        return cached
+    
+    completed = {"open": False, "done": True, "all": None}[todo_status]
+    agenda = await async_crud.get_todo_agenda(
+        db, current_user.id, start, end, zone, completed=completed, limit=limit
+    )
+    return dict(agenda, timezone=tz)
 
 @app.get("/todos/{todo_id}", response_model=TodoResponse)
 async def get_todo(
     todo_id: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    """Get a specific todo by ID"""
-    todo = crud.get_todo(db=db, todo_id=todo_id, user_id=current_user.id)
+    """Get a specific todo by ID, optionally restricted to some fields"""
+    requested = sparse_fields(fields)
+    cached = await not_modified(request, response, db, current_user.id)
+    if cached:
+        return cached
+    
+    todo = await async_crud.get_todo(db=db, todo_id=todo_id, user_id=current_user.id, columns=requested)
     if todo is None:
         raise HTTPException(status_code=404, detail="Todo not found")
+    if requested:
+        return Response(
+            serialization.dumps(dict(zip(requested, todo))),
+            media_type="application/json",
+            headers=dict(response.headers),
+        )
     return todo
 
 @app.put("/todos/{todo_id}", response_model=TodoResponse)
@@ -143,10 +488,10 @@ async def update_todo(
     todo_id: int,
     todo_update: TodoUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_db)
 ):
     """Update a specific todo"""
-    todo = crud.update_todo(
+    todo = await async_crud.update_todo(
         db=db,
         todo_id=todo_id,
         todo_update=todo_update,
@@ -160,24 +505,96 @@ async def update_todo(
 async def delete_todo(
     todo_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_db)
 ):
     """Delete a specific todo"""
-    success = crud.delete_todo(db=db, todo_id=todo_id, user_id=current_user.id)
+    success = await async_crud.delete_todo(db=db, todo_id=todo_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Todo not found")
     return {"message": "Todo deleted successfully"}
 
 @app.get("/todos/stats/summary")
 async def get_todo_stats(
+    request: Request,
+    response: Response,
+    include_archived: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
     """Get todo statistics for the current user"""
-    stats = crud.get_todo_stats(db=db, user_id=current_user.id)
+    # Overdue and due-today counts roll over at midnight, so the date is
+    # part of the validator
+    cached = await not_modified(request, response, db, current_user.id, date.today().isoformat())
+    if cached:
+        return cached
+    
+    stats = await async_crud.get_todo_stats(
+        db=db, user_id=current_user.id, include_archived=include_archived
+    )
     return stats
 
+# Real-time change feed
+async def _send_events(websocket: WebSocket, subscription, last_version: int):
+    """Forward queued events to the client, skipping ones already sent"""
+    while True:
+        event = await subscription.queue.get()
+        if event["type"] != "resync" and event["version"] <= last_version:
+            continue
+        await websocket.send_json(event)
+        last_version = max(last_version, event.get("version") or 0)
+
+@app.websocket("/ws/todos")
+async def todo_changes(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    since: Optional[int] = None
+):
+    """Push the current user's todo changes as JSON messages
+
+    Authenticate with ?token= (browsers can't set WebSocket headers) or an
+    Authorization header. Pass ?since=<version> to be replayed the events
+    missed while disconnected; if they are no longer available a "resync"
+    message tells the client to refetch. "ready" carries the current version.
+    """
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else ""
+    
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await authenticate_token(token, db)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+    user_id = user.id
+    
+    await websocket.accept()
+    # Subscribe before reading the version so no event can fall in between
+    async with events.hub.subscribe(user_id) as subscription:
+        async with shards.router.session(user_id) as db:
+            version, _ = await async_crud.get_data_version(db, user_id)
+        
+        last_version = version
+        if since is not None and since != version:
+            missed = events.hub.replay(user_id, since) if since < version else None
+            if missed and missed[-1]["version"] >= version:
+                for event in missed:
+                    await websocket.send_json(event)
+                last_version = missed[-1]["version"]
+            else:
+                await websocket.send_json({"type": "resync", "version": version})
+        await websocket.send_json({"type": "ready", "version": last_version})
+        
+        sender = asyncio.create_task(_send_events(websocket, subscription, last_version))
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
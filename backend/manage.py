@@ -0,0 +1,176 @@
+"""
+Maintenance commands for the Todo API backend
+
+Usage:
+    python manage.py migrate [--revision REV]
+    python manage.py counters rebuild [--user-id ID]
+    python manage.py counters verify [--user-id ID]
+    python manage.py archive run [--after-days N] [--batch-size N]
+    python manage.py archive restore --user-id ID TODO_ID [TODO_ID ...]
+    python manage.py shards list
+    python manage.py shards move --user-id ID --to SHARD [--settle-seconds N]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, inspect
+
+from database import SessionLocal
+from config import settings
+from models import Todo, User
+import crud
+import shards
+
+MIGRATIONS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+# The original users and todos tables. Later versions that still created
+# their schema at import only added to it, which 0001 fills in.
+LEGACY_REVISION = "0000"
+
+def migrate_shard(shard: shards.Shard, revision: str = "head") -> str:
+    """Upgrade one shard's schema, returning the revision it is now at"""
+    from alembic import command
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+
+    with shard.engine.begin() as conn:
+        config = Config(MIGRATIONS_CONFIG)
+        config.attributes["connection"] = conn
+        tables = inspect(conn)
+        if tables.has_table("todos") and not tables.has_table("alembic_version"):
+            # Created at import by an earlier version of the app
+            command.stamp(config, LEGACY_REVISION)
+        command.upgrade(config, revision)
+        current = MigrationContext.configure(conn).get_current_revision()
+    shards.reserve_id_space(shard)
+    return current
+
+def migrate_all(revision: str = "head"):
+    """Upgrade every shard's schema"""
+    for shard in shards.router.shards:
+        migrate_shard(shard, revision)
+
+def _user_ids(db, user_id=None):
+    """Return the requested user id, or every user id"""
+    if user_id is not None:
+        return [user_id]
+    return [row.id for row in db.query(User.id).order_by(User.id)]
+
+def migrate(args) -> int:
+    """Apply schema migrations to every shard"""
+    for shard in shards.router.shards:
+        print(f"shard {shard.id}: at revision {migrate_shard(shard, args.revision)}")
+    return 0
+
+def counters_rebuild(args) -> int:
+    """Recompute todo counters from the todos table"""
+    with SessionLocal() as directory:
+        user_ids = _user_ids(directory, args.user_id)
+    for user_id in user_ids:
+        with shards.router.sync_session(user_id) as db:
+            crud.rebuild_todo_counters(db, user_id)
+            db.commit()
+        print(f"user {user_id}: counters rebuilt")
+    return 0
+
+def counters_verify(args) -> int:
+    """Report users whose todo counters have drifted"""
+    with SessionLocal() as directory:
+        user_ids = _user_ids(directory, args.user_id)
+    drifted = 0
+    for user_id in user_ids:
+        with shards.router.sync_session(user_id) as db:
+            drift = crud.verify_todo_counters(db, user_id)
+        if drift:
+            drifted += 1
+            print(f"user {user_id}: drift {drift}")
+    print(f"{drifted} user(s) with counter drift")
+    return 1 if drifted else 0
+
+def archive_run(args) -> int:
+    """Move todos completed more than N days ago into the archive"""
+    completed_before = datetime.utcnow() - timedelta(days=args.after_days)
+    moved = 0
+    for shard in shards.router.shards:
+        with shard.SessionLocal() as db:
+            while True:
+                count = crud.archive_completed_todos(db, completed_before, args.batch_size)
+                moved += count
+                if count < args.batch_size:
+                    break
+    print(f"{moved} todo(s) archived")
+    return 0
+
+def archive_restore(args) -> int:
+    """Move archived todos back into the todos table"""
+    with shards.router.sync_session(args.user_id) as db:
+        restored = crud.restore_todos(db, args.todo_ids, args.user_id)
+    missing = sorted(set(args.todo_ids) - restored)
+    print(f"{len(restored)} todo(s) restored")
+    if missing:
+        print(f"not archived for user {args.user_id}: {missing}")
+    return 1 if missing else 0
+
+def shards_list(args) -> int:
+    """Show each shard with its number of todos"""
+    for shard in shards.router.shards:
+        with shard.SessionLocal() as db:
+            todos = db.scalar(func.count(Todo.id).select())
+        print(f"shard {shard.id}: {shard.engine.url.render_as_string()} ({todos} todo(s))")
+    return 0
+
+def shards_move(args) -> int:
+    """Move a user's todos to another shard"""
+    if not 0 <= args.to < len(shards.router):
+        print(f"no shard {args.to}; configured shards are 0-{len(shards.router) - 1}")
+        return 1
+    moved = shards.move_user(args.user_id, args.to, args.settle_seconds)
+    print(f"user {args.user_id}: {moved} row(s) moved to shard {args.to}")
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Todo API maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upgrade = commands.add_parser("migrate", help=migrate.__doc__)
+    upgrade.add_argument("--revision", default="head")
+    upgrade.set_defaults(handler=migrate)
+
+    counters = commands.add_parser("counters", help="Manage per-user todo counters")
+    counters_commands = counters.add_subparsers(dest="action", required=True)
+    for name, handler in (("rebuild", counters_rebuild), ("verify", counters_verify)):
+        action = counters_commands.add_parser(name, help=handler.__doc__)
+        action.add_argument("--user-id", type=int, default=None)
+        action.set_defaults(handler=handler)
+
+    archive = commands.add_parser("archive", help="Move completed todos in and out of the archive")
+    archive_commands = archive.add_subparsers(dest="action", required=True)
+    run = archive_commands.add_parser("run", help=archive_run.__doc__)
+    run.add_argument("--after-days", type=int, default=settings.archive_after_days)
+    run.add_argument("--batch-size", type=int, default=settings.archive_batch_size)
+    run.set_defaults(handler=archive_run)
+    restore = archive_commands.add_parser("restore", help=archive_restore.__doc__)
+    restore.add_argument("--user-id", type=int, required=True)
+    restore.add_argument("todo_ids", type=int, nargs="+")
+    restore.set_defaults(handler=archive_restore)
+
+    shard = commands.add_parser("shards", help="Inspect and rebalance database shards")
+    shard_commands = shard.add_subparsers(dest="action", required=True)
+    shard_commands.add_parser("list", help=shards_list.__doc__).set_defaults(handler=shards_list)
+    move = shard_commands.add_parser("move", help=shards_move.__doc__)
+    move.add_argument("--user-id", type=int, required=True)
+    move.add_argument("--to", type=int, required=True)
+    move.add_argument("--settle-seconds", type=float, default=settings.user_cache_ttl_seconds,
+                      help="how long workers may route the user to the old shard")
+    move.set_defaults(handler=shards_move)
+
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Per-request performance instrumentation and Prometheus text output
+
+MetricsMiddleware times every HTTP request by route template, and the
+cursor event hooks count SQL statements and their time against the
+request that issued them (tracked through a context variable, which
+SQLAlchemy's async greenlets share with the calling task). Statements
+slower than SLOW_QUERY_MS are logged. The engines' pools report how long
+each connection checkout waited, overall and per request, so pool
+contention shows up before it turns into timeouts. Everything is plain
+counters under a lock, cheap enough to leave on under load.
+"""
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    """Labelled histograms and counters rendered as Prometheus text"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Tuple[str, Sequence[float], Dict[tuple, Histogram]]] = {}
+        self._counters: Dict[str, Tuple[str, Dict[tuple, float]]] = {}
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float]):
+        self._histograms[name] = (help_text, buckets, {})
+
+    def counter(self, name: str, help_text: str):
+        self._counters[name] = (help_text, {})
+
+    def observe(self, name: str, value: float, **labels):
+        _, buckets, series = self._histograms[name]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        _, series = self._counters[name]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series[key] = series.get(key, 0) + value
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets, series) in self._histograms.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+            for name, (help_text, series) in self._counters.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+def _labels(key: tuple, **extra) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+registry = Registry()
+registry.histogram(
+    "todo_http_request_duration_seconds", "HTTP request latency by route", LATENCY_BUCKETS
+)
+registry.histogram(
+    "todo_db_statements_per_request", "SQL statements issued per HTTP request", STATEMENT_BUCKETS
+)
+registry.histogram(
+    "todo_db_time_per_request_seconds", "Time spent in SQL per HTTP request", LATENCY_BUCKETS
+)
+registry.histogram(
+    "todo_db_pool_wait_seconds", "Time spent waiting to check out a pooled connection", POOL_WAIT_BUCKETS
+)
+registry.histogram(
+    "todo_db_pool_checkouts_per_request", "Pooled connections checked out per HTTP request", STATEMENT_BUCKETS
+)
+registry.histogram(
+    "todo_db_pool_wait_per_request_seconds", "Time spent waiting for pooled connections per HTTP request",
+    POOL_WAIT_BUCKETS
+)
+registry.counter("todo_db_statements_total", "SQL statements executed")
+registry.counter("todo_db_slow_queries_total", "SQL statements slower than the slow query threshold")
+registry.counter("todo_db_pool_timeouts_total", "Connection checkouts that timed out waiting for the pool")
+
+class RequestStats:
+    """SQL work attributed to the current request"""
+
+    __slots__ = ("statements", "sql_time", "checkouts", "pool_wait")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_time = 0.0
+        self.checkouts = 0
+        self.pool_wait = 0.0
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_time += elapsed
+
+    registry.inc("todo_db_statements_total")
+    if elapsed * 1000 >= settings.slow_query_ms:
+        registry.inc("todo_db_slow_queries_total")
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+def record_checkout(wait: float, timed_out: bool = False):
+    """Account one connection checkout and how long it waited for the pool"""
+    registry.observe("todo_db_pool_wait_seconds", wait)
+    if timed_out:
+        registry.inc("todo_db_pool_timeouts_total")
+    stats = current_request.get()
+    if stats is not None:
+        stats.checkouts += 1
+        stats.pool_wait += wait
+
+def instrument_engine(engine):
+    """Count and time every statement run through an engine"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL work per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            registry.observe(
+                "todo_http_request_duration_seconds", elapsed,
+                method=scope["method"], route=path, status=status_code
+            )
+            registry.observe("todo_db_statements_per_request", stats.statements, route=path)
+            registry.observe("todo_db_time_per_request_seconds", stats.sql_time, route=path)
+            registry.observe("todo_db_pool_checkouts_per_request", stats.checkouts, route=path)
+            registry.observe("todo_db_pool_wait_per_request_seconds", stats.pool_wait, route=path)
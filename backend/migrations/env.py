@@ -0,0 +1,65 @@
+"""
+Alembic environment for the Todo API schema
+
+Runs against the connection passed in config.attributes["connection"]
+(how manage.py migrates each shard), or else against DATABASE_URL.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from config import settings
+from models import Base
+
+config = context.config
+
+# Callers passing a connection keep their own logging setup
+if config.config_file_name is not None and "connection" not in config.attributes:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+def include_object(object, name, type_, reflected, compare_to):
+    # The full-text index tables come from search.py's DDL, not the models
+    return not (type_ == "table" and name.startswith("todos_fts"))
+
+def run_migrations_offline():
+    """Emit the migration SQL for DATABASE_URL without connecting"""
+    context.configure(
+        url=settings.database_url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True,
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def _run(connection):
+    # Batch mode lets ALTER-style operations work on SQLite
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    engine = create_engine(settings.database_url)
+    try:
+        with engine.connect() as connection:
+            _run(connection)
+    finally:
+        engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
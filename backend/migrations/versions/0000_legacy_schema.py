@@ -0,0 +1,64 @@
+"""Legacy schema
+
+The users and todos tables as the original app created them at import,
+before it had migrations. `manage.py migrate` stamps databases created
+that way, and by later versions that still created their schema at
+import, at this revision so that 0001 brings them up to date.
+
+Revision ID: 0000
+Revises:
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0000"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+priority_level = sa.Enum("LOW", "MEDIUM", "HIGH", name="prioritylevel")
+category_type = sa.Enum("PERSONAL", "WORK", "SHOPPING", "HEALTH", "OTHER", name="categorytype")
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_id", "users", ["id"])
+
+    op.create_table(
+        "todos",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("completed", sa.Boolean(), nullable=False),
+        sa.Column("priority", priority_level, nullable=False),
+        sa.Column("category", category_type, nullable=False),
+        sa.Column("due_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_todos_id", "todos", ["id"])
+    op.create_index("ix_todos_title", "todos", ["title"])
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    op.drop_table("todos")
+    op.drop_table("users")
+    category_type.drop(bind, checkfirst=True)
+    priority_level.drop(bind, checkfirst=True)
@@ -0,0 +1,130 @@
+"""Baseline schema
+
+Everything the app added on top of the legacy users and todos tables
+while it still created its schema at import: the archive, counter,
+data version and shard directory tables, the todos indexes and the
+full-text search index, which is filled from the existing todos. A
+database created at import by any of those versions has some of these
+already, so each is only created when missing.
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+import search
+
+revision: str = "0001"
+down_revision: Union[str, None] = "0000"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The legacy todos table already created these types on PostgreSQL
+priority_level = sa.Enum("LOW", "MEDIUM", "HIGH", name="prioritylevel").with_variant(
+    postgresql.ENUM("LOW", "MEDIUM", "HIGH", name="prioritylevel", create_type=False), "postgresql"
+)
+category_type = sa.Enum("PERSONAL", "WORK", "SHOPPING", "HEALTH", "OTHER", name="categorytype").with_variant(
+    postgresql.ENUM("PERSONAL", "WORK", "SHOPPING", "HEALTH", "OTHER", name="categorytype", create_type=False),
+    "postgresql"
+)
+
+TODOS_INDEXES = {
+    "ix_todos_owner_created_id": ["owner_id", "created_at", "id"],
+    "ix_todos_completed_at": ["completed_at"],
+}
+
+def _existing_schema():
+    """Return the names of the tables and of the todos indexes already there"""
+    if op.get_context().as_sql:
+        # Emitting SQL without a database: assume the legacy schema
+        return {"users", "todos"}, {"ix_todos_id", "ix_todos_title"}
+    inspector = sa.inspect(op.get_bind())
+    return (
+        set(inspector.get_table_names()),
+        {index["name"] for index in inspector.get_indexes("todos")},
+    )
+
+def upgrade() -> None:
+    tables, indexes = _existing_schema()
+
+    for name, columns in TODOS_INDEXES.items():
+        if name not in indexes:
+            op.create_index(name, "todos", columns)
+
+    if "archived_todos" not in tables:
+        op.create_table(
+            "archived_todos",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("title", sa.String(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("completed", sa.Boolean(), nullable=False),
+            sa.Column("priority", priority_level, nullable=False),
+            sa.Column("category", category_type, nullable=False),
+            sa.Column("due_date", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("owner_id", sa.Integer(), nullable=False),
+            sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_archived_todos_owner_created_id", "archived_todos", ["owner_id", "created_at", "id"]
+        )
+
+    if "todo_counters" not in tables:
+        op.create_table(
+            "todo_counters",
+            sa.Column("owner_id", sa.Integer(), nullable=False),
+            *[
+                sa.Column(name, sa.Integer(), nullable=False)
+                for name in (
+                    "total", "completed", "priority_low", "priority_medium", "priority_high",
+                    "category_personal", "category_work", "category_shopping", "category_health",
+                    "category_other",
+                )
+            ],
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("owner_id"),
+        )
+    if "data_versions" not in tables:
+        op.create_table(
+            "data_versions",
+            sa.Column("owner_id", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("owner_id"),
+        )
+    if "user_shards" not in tables:
+        op.create_table(
+            "user_shards",
+            sa.Column("owner_id", sa.Integer(), nullable=False),
+            sa.Column("shard", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("owner_id"),
+        )
+
+    # Index the todos that were written before the search table existed
+    search.create_index(op.get_bind(), rebuild="todos_fts" not in tables)
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        # todos stays, so its search triggers are dropped by name
+        for action in ("insert", "delete", "update"):
+            op.execute(f"DROP TRIGGER IF EXISTS todos_fts_{action}")
+        op.execute("DROP TABLE IF EXISTS todos_fts")
+    elif bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_todos_search_vector")
+        op.execute("ALTER TABLE todos DROP COLUMN IF EXISTS search_vector")
+    for table in ("user_shards", "data_versions", "todo_counters", "archived_todos"):
+        op.drop_table(table)
+    for name in TODOS_INDEXES:
+        op.drop_index(name, table_name="todos")
@@ -0,0 +1,22 @@
+"""Index todos by owner, completion and due date
+
+Serves the agenda's due-date range scans and the overdue counts.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_index("ix_todos_owner_completed_due", "todos", ["owner_id", "completed", "due_date"])
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_owner_completed_due", table_name="todos")
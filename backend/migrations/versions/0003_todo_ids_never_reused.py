@@ -0,0 +1,91 @@
+"""Never reuse todo ids on SQLite
+
+Archived todos keep their ids and are restored with them, so a new todo
+must not be given the id of an archived one. Without AUTOINCREMENT,
+SQLite hands out max(id) + 1, which can be an archived id once the
+newest todos are archived. Tables created before todos had
+AUTOINCREMENT are rebuilt with it, and the sequence starts above every
+id in either table. PostgreSQL sequences never go back, so only SQLite
+is affected.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import search
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def _todos_table() -> sa.Table:
+    """todos as 0000 to 0002 leave it, for emitting SQL without reflecting"""
+    metadata = sa.MetaData()
+    sa.Table("users", metadata, sa.Column("id", sa.Integer(), primary_key=True))
+    return sa.Table(
+        "todos",
+        metadata,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("completed", sa.Boolean(), nullable=False),
+        sa.Column("priority", sa.Enum("LOW", "MEDIUM", "HIGH", name="prioritylevel"), nullable=False),
+        sa.Column(
+            "category",
+            sa.Enum("PERSONAL", "WORK", "SHOPPING", "HEALTH", "OTHER", name="categorytype"),
+            nullable=False,
+        ),
+        sa.Column("due_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Index("ix_todos_id", "id"),
+        sa.Index("ix_todos_title", "title"),
+        sa.Index("ix_todos_owner_created_id", "owner_id", "created_at", "id"),
+        sa.Index("ix_todos_completed_at", "completed_at"),
+        sa.Index("ix_todos_owner_completed_due", "owner_id", "completed", "due_date"),
+    )
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    copy_from = None
+    if op.get_context().as_sql:
+        # Emitting SQL without a database: assume todos came from 0000
+        copy_from = _todos_table()
+        has_fts = True
+    else:
+        ddl = bind.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'todos'")).scalar()
+        if "AUTOINCREMENT" in ddl.upper():
+            return
+        has_fts = bind.execute(sa.text("SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'")).first()
+    # Copies the rows with their ids; the FTS triggers go with the old table
+    with op.batch_alter_table(
+        "todos", recreate="always", copy_from=copy_from, table_kwargs={"sqlite_autoincrement": True}
+    ):
+        pass
+    if has_fts:
+        search.create_index(bind)
+    op.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'todos', 0 WHERE NOT EXISTS "
+               "(SELECT 1 FROM sqlite_sequence WHERE name = 'todos')")
+    op.execute(
+        """
+        UPDATE sqlite_sequence SET seq = max(
+            seq,
+            coalesce((SELECT max(id) FROM todos), 0),
+            coalesce((SELECT max(id) FROM archived_todos), 0)
+        ) WHERE name = 'todos'
+        """
+    )
+
+def downgrade() -> None:
+    # Keeping AUTOINCREMENT is harmless, and dropping it would allow reuse again
+    pass
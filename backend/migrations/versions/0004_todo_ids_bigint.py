@@ -0,0 +1,46 @@
+"""Widen todo ids to 64 bits outside SQLite
+
+Shard n allocates todo ids from n * 2**40, past what a 32-bit SERIAL
+column and its sequence can hold. SQLite's INTEGER is already 64-bit.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def _todo_id_sequence(bind) -> str:
+    if op.get_context().as_sql:
+        # No database to ask when emitting SQL; SERIAL's default name
+        return "todos_id_seq"
+    return bind.execute(sa.text("SELECT pg_get_serial_sequence('todos', 'id')")).scalar()
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        return
+    for table in ("todos", "archived_todos"):
+        op.alter_column(table, "id", type_=sa.BigInteger(), existing_type=sa.Integer(), existing_nullable=False)
+    if bind.dialect.name == "postgresql":
+        sequence = _todo_id_sequence(bind)
+        if sequence:
+            op.execute(f"ALTER SEQUENCE {sequence} AS bigint")
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        return
+    if bind.dialect.name == "postgresql":
+        sequence = _todo_id_sequence(bind)
+        if sequence:
+            op.execute(f"ALTER SEQUENCE {sequence} AS integer")
+    for table in ("todos", "archived_todos"):
+        op.alter_column(table, "id", type_=sa.Integer(), existing_type=sa.BigInteger(), existing_nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -19,6 +19,10 @@ class CategoryType(str, enum.Enum):
     HEALTH = "health"
     OTHER = "other"
 
+# Shards allocate todo ids above 32 bits (shards.SHARD_ID_SPACE). SQLite's INTEGER is
+# already 64-bit, and only INTEGER keys can use AUTOINCREMENT there.
+TodoId = BigInteger().with_variant(Integer, "sqlite")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -36,7 +40,7 @@ class User(Base):
 class Todo(Base):
     __tablename__ = "todos"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(TodoId, primary_key=True, index=True)
     title = Column(String, nullable=False, index=True)
     description = Column(Text, nullable=True)
     completed = Column(Boolean, default=False, nullable=False)
@@ -52,3 +56,70 @@ class Todo(Base):
     
     # Relationship with user
     owner = relationship("User", back_populates="todos")
+
+    __table_args__ = (
+        # Serves owner-scoped listing in (created_at, id) keyset order
+        Index("ix_todos_owner_created_id", "owner_id", "created_at", "id"),
+        # Lets archive compaction find old completed todos without a scan
+        Index("ix_todos_completed_at", "completed_at"),
+        # Range scans of open (or done) todos by due date: agenda, overdue
+        Index("ix_todos_owner_completed_due", "owner_id", "completed", "due_date"),
+        # Never reuse ids, which archived todos keep
+        {"sqlite_autoincrement": True},
+    )
+
+class ArchivedTodo(Base):
+    __tablename__ = "archived_todos"
+
+    # Completed todos moved out of the hot table, keeping their ids
+    id = Column(TodoId, primary_key=True)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    completed = Column(Boolean, default=True, nullable=False)
+    priority = Column(Enum(PriorityLevel), default=PriorityLevel.MEDIUM, nullable=False)
+    category = Column(Enum(CategoryType), default=CategoryType.PERSONAL, nullable=False)
+    due_date = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_archived_todos_owner_created_id", "owner_id", "created_at", "id"),
+    )
+
+class TodoCounter(Base):
+    __tablename__ = "todo_counters"
+
+    # One row per user, maintained by crud alongside every todo mutation
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total = Column(Integer, default=0, nullable=False)
+    completed = Column(Integer, default=0, nullable=False)
+
+    # Counts by priority
+    priority_low = Column(Integer, default=0, nullable=False)
+    priority_medium = Column(Integer, default=0, nullable=False)
+    priority_high = Column(Integer, default=0, nullable=False)
+
+    # Counts by category
+    category_personal = Column(Integer, default=0, nullable=False)
+    category_work = Column(Integer, default=0, nullable=False)
+    category_shopping = Column(Integer, default=0, nullable=False)
+    category_health = Column(Integer, default=0, nullable=False)
+    category_other = Column(Integer, default=0, nullable=False)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    # Bumped by every crud function that changes a user's todos
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+class UserShard(Base):
+    __tablename__ = "user_shards"
+
+    # Shard holding a user's todos; users without a row live on shard 0
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard = Column(Integer, nullable=False)
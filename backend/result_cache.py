@@ -0,0 +1,127 @@
+"""
+Read-through cache of GET /todos pages
+
+Pages are cached as encoded response bodies, keyed on the user, their
+data version and every query parameter that shapes the page (filters,
+pagination and fields). Because the data version is in the key, a cached
+page always matches the database state it was read from, replicas
+included. On top of that, every committed change to a user's todos bumps
+a per-user generation that is also part of the key, dropping their pages
+right away on every worker sharing the backend.
+
+The default backend is an in-process LRU. A shared store can be installed
+with set_backend(); it only needs get, set with a TTL, and incr, which a
+Redis client provides.
+"""
+import hashlib
+import json
+import threading
+from typing import Optional, Tuple
+
+from cache import TTLCache
+from config import settings
+import events
+import metrics
+
+metrics.registry.counter("todo_result_cache_hits_total", "GET /todos pages served from the result cache")
+metrics.registry.counter("todo_result_cache_misses_total", "GET /todos pages not found in the result cache")
+metrics.registry.counter("todo_result_cache_invalidations_total", "Per-user result cache invalidations")
+
+class CacheBackend:
+    """Interface for the key-value store behind the result cache"""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        """Atomically increment an integer counter, starting from 0"""
+        raise NotImplementedError
+
+class LocalBackend(CacheBackend):
+    """In-process LRU backend"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._entries.set(key, value, ttl)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._entries.get(key) or 0) + 1
+            # Generations must outlive the pages they guard
+            self._entries.set(key, value, float("inf"))
+            return value
+
+class ExternalBackend(CacheBackend):
+    """Backend over a shared store client with get/set/incr, such as Redis"""
+
+    def __init__(self, client, prefix: str = "todo-api:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(self.prefix + key)
+
+class ResultCache:
+    """Caches encoded todo pages and counts hits and misses"""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, user_id: int, version_tag: str, params: dict) -> str:
+        """Build the key for a page of a user's todos"""
+        generation = int(self.backend.get(f"gen:{user_id}") or 0)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"todos:{user_id}:{generation}:{version_tag}:{digest}"
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """Return a cached (body, next_cursor), or None"""
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            metrics.registry.inc("todo_result_cache_misses_total")
+            return None
+        self.hits += 1
+        metrics.registry.inc("todo_result_cache_hits_total")
+        cursor, _, body = value.partition(b"\n")
+        return body, cursor.decode() or None
+
+    def set(self, key: str, body: bytes, next_cursor: Optional[str]):
+        self.backend.set(key, (next_cursor or "").encode() + b"\n" + body, self.ttl)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached page of a user's todos"""
+        self.backend.incr(f"gen:{user_id}")
+        metrics.registry.inc("todo_result_cache_invalidations_total")
+
+cache = ResultCache(
+    LocalBackend(settings.result_cache_size, settings.result_cache_ttl_seconds),
+    settings.result_cache_ttl_seconds,
+)
+
+def set_backend(backend: CacheBackend):
+    """Replace the backend, e.g. with a store shared between workers"""
+    cache.backend = backend
+
+def _invalidate_on_change(user_id: int, event: dict):
+    cache.invalidate_user(user_id)
+
+# Every crud function that changes todos publishes once it has committed
+events.add_listener(_invalidate_on_change)
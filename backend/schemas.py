@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
-from datetime import datetime
+from typing import Optional, List, Literal
+from datetime import date, datetime
 from models import PriorityLevel, CategoryType
 
 # User schemas
@@ -30,6 +30,10 @@ class TodoBase(BaseModel):
 class TodoCreate(TodoBase):
     pass
 
+class TodoImport(TodoCreate):
+    completed: bool = False
+    completed_at: Optional[datetime] = None
+
 class TodoUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=200)
     description: Optional[str] = Field(None, max_length=1000)
@@ -58,3 +62,63 @@ class TodoStats(BaseModel):
     due_today: int
     by_priority: dict
     by_category: dict
+
+# Agenda schemas
+class AgendaDay(BaseModel):
+    date: date
+    count: int
+
+class AgendaWeek(BaseModel):
+    week_start: date
+    count: int
+
+class TodoAgenda(BaseModel):
+    start: date
+    end: date
+    timezone: str
+    total: int
+    days: List[AgendaDay]
+    weeks: List[AgendaWeek]
+    todos: List[TodoResponse]
+
+# Batch schemas
+MAX_BATCH_SIZE = 1000
+
+class TodoBatchCreate(BaseModel):
+    todos: List[TodoCreate] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class TodoBatchUpdateItem(TodoUpdate):
+    id: int
+
+class TodoBatchUpdate(BaseModel):
+    updates: List[TodoBatchUpdateItem] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class TodoBatchDelete(BaseModel):
+    ids: List[int] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class TodoBatchRestore(BaseModel):
+    ids: List[int] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class TodoBatchItemResult(BaseModel):
+    index: int
+    id: Optional[int]
+    status: Literal["created", "updated", "deleted", "restored", "not_found"]
+
+class TodoBatchResponse(BaseModel):
+    results: List[TodoBatchItemResult]
+
+class TodoFilter(BaseModel):
+    category: Optional[CategoryType] = None
+    priority: Optional[PriorityLevel] = None
+    completed: Optional[bool] = None
+
+class TodoBatchWhere(BaseModel):
+    filter: TodoFilter = TodoFilter()
+    action: Literal["complete", "reopen", "delete"]
+
+class TodoBatchWhereResponse(BaseModel):
+    affected: int
+
+class TodoImportResponse(BaseModel):
+    imported: int
+    errors: List[dict]
@@ -0,0 +1,159 @@
+"""
+Full-text search over todo titles and descriptions
+
+SQLite uses an external-content FTS5 table kept in sync by triggers, and
+PostgreSQL uses a generated tsvector column with a GIN index. The schema
+migrations create them; the first search on each database checks they
+are there. Any other database, or a SQLite build without FTS5, falls back
+to ILIKE matching.
+"""
+import logging
+import re
+
+from sqlalchemy import Integer, column, func, literal_column, or_, table, text
+from sqlalchemy.exc import OperationalError
+
+from models import Todo
+
+logger = logging.getLogger(__name__)
+
+# Whether each database has the full-text index, probed on first search
+_available = {}
+
+todos_fts = table("todos_fts", column("rowid", Integer))
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5(
+        title, description,
+        content='todos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN
+        INSERT INTO todos_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE OF title, description ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO todos_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+POSTGRESQL_DDL = [
+    """
+    ALTER TABLE todos ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_todos_search_vector ON todos USING GIN (search_vector)",
+]
+
+def create_index(conn, rebuild: bool = False) -> bool:
+    """Create the full-text index on a connection, returning whether it exists
+
+    Run by the schema migrations, which pass rebuild when the SQLite index
+    is new so that todos written before it existed are indexed. A SQLite
+    build without FTS5 is left on ILIKE matching instead of failing the
+    migration.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        try:
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+        except OperationalError:
+            logger.warning("SQLite has no FTS5, todo search will use ILIKE")
+            return False
+        if rebuild:
+            conn.execute(text("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')"))
+        return True
+    if dialect == "postgresql":
+        for statement in POSTGRESQL_DDL:
+            conn.execute(text(statement))
+        return True
+    return False
+
+def _probe(engine) -> bool:
+    """Check whether the migrations created a usable full-text index"""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        probe = "SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'"
+    elif dialect == "postgresql":
+        probe = (
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'todos' AND column_name = 'search_vector'"
+        )
+    else:
+        return False
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text(probe)).first() is not None
+    except OperationalError:
+        return False
+
+def is_available(engine) -> bool:
+    """Whether an engine's database has the full-text index, checked once"""
+    key = _database_key(engine)
+    available = _available.get(key)
+    if available is None:
+        available = _available[key] = _probe(engine)
+        if not available:
+            logger.warning("Full-text search unavailable on %s, using ILIKE", engine.dialect.name)
+    return available
+
+def _database_key(engine) -> str:
+    """Identify an engine's database independently of its driver"""
+    return engine.url.set(drivername=engine.dialect.name).render_as_string()
+
+def _terms(search: str):
+    """Split a search string into word tokens safe for a match expression"""
+    return re.findall(r"\w+", search)
+
+def apply_search(query, engine, search: str, rank: bool = True):
+    """Restrict a todo query (ORM or Core) to rows matching a search string
+
+    Every word must match, with the last word treated as a prefix so that
+    search-as-you-type works. When rank is true the best matches come first.
+    """
+    terms = _terms(search)
+    dialect = engine.dialect.name
+    if not terms or not is_available(engine):
+        return query.where(
+            or_(
+                Todo.title.ilike(f"%{search}%"),
+                Todo.description.ilike(f"%{search}%")
+            )
+        )
+
+    if dialect == "sqlite":
+        expression = " ".join(f'"{term}"' for term in terms[:-1])
+        expression = f'{expression} "{terms[-1]}"*'.strip()
+        query = query.join(todos_fts, todos_fts.c.rowid == Todo.id).where(
+            literal_column("todos_fts").op("MATCH")(expression)
+        )
+        if rank:
+            # bm25() is lower for better matches
+            query = query.order_by(func.bm25(literal_column("todos_fts")))
+        return query
+
+    tsquery = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+    tsquery = func.to_tsquery("simple", tsquery)
+    search_vector = literal_column("todos.search_vector")
+    query = query.where(search_vector.op("@@")(tsquery))
+    if rank:
+        query = query.order_by(func.ts_rank_cd(search_vector, tsquery).desc())
+    return query
@@ -0,0 +1,248 @@
+"""
+Owner-based sharding of todo data across several databases
+
+Shard 0 is DATABASE_URL and also holds the users table and the shard
+directory. DATABASE_SHARD_URLS adds shards 1..N. All of a user's todos,
+archived todos, counters and data version live together on one shard,
+so every per-user query runs against a single database.
+
+New users are spread round robin by id. Users without a directory entry
+live on shard 0, so configuring more shards never moves existing data;
+`manage.py shards move` rebalances a user. Each shard allocates todo ids
+from its own range, so ids stay unique when todos move between shards.
+
+Routing is cached per worker like authenticated users, so after a move
+other workers pick up the new shard within USER_CACHE_TTL_SECONDS. A
+move waits that long before it removes the user's rows from the old shard.
+"""
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from cache import TTLCache
+from config import settings
+from database import (
+    AsyncReadSessionLocal, AsyncSessionLocal, SessionLocal, async_engine,
+    build_async_engine, build_engine, engine
+)
+from models import ArchivedTodo, DataVersion, Todo, TodoCounter, User
+import crud
+
+# Todo ids on shard n start above n * SHARD_ID_SPACE
+SHARD_ID_SPACE = 1 << 40
+
+# Tables whose rows belong to a single owner and move with them
+OWNER_TABLES = [Todo.__table__, ArchivedTodo.__table__, TodoCounter.__table__, DataVersion.__table__]
+
+MOVE_CHUNK_SIZE = 500
+
+class Shard:
+    """Engines and session factories for one database"""
+
+    def __init__(self, shard_id: int, engine, async_engine, session_factory,
+                 async_session_factory, async_read_session_factory=None):
+        self.id = shard_id
+        self.engine = engine
+        self.async_engine = async_engine
+        self.SessionLocal = session_factory
+        self.AsyncSessionLocal = async_session_factory
+        self.AsyncReadSessionLocal = async_read_session_factory or async_session_factory
+
+    @classmethod
+    def from_url(cls, shard_id: int, url: str) -> "Shard":
+        sync_engine = build_engine(url)
+        shard_async_engine = build_async_engine(url)
+        return cls(
+            shard_id,
+            sync_engine,
+            shard_async_engine,
+            sessionmaker(autocommit=False, autoflush=False, bind=sync_engine),
+            async_sessionmaker(shard_async_engine, autoflush=False, expire_on_commit=False),
+        )
+
+class ShardRouter:
+    """Maps owner ids to the shard holding their todos"""
+
+    def __init__(self, shards: List[Shard]):
+        self.shards = shards
+        self._cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def shard_for_new_user(self, user_id: int) -> int:
+        return user_id % len(self.shards)
+
+    def lookup(self, db: Session, user_id: int) -> int:
+        """Return a user's shard id, reading the directory on db if needed"""
+        if len(self.shards) == 1:
+            return 0
+        shard_id = self._cache.get(user_id)
+        if shard_id is None:
+            shard_id = crud.get_user_shard(db, user_id)
+            self._cache.set(user_id, shard_id)
+        return shard_id
+
+    async def resolve(self, user_id: int, db: Optional[AsyncSession] = None) -> Shard:
+        """Return the shard holding a user's todos
+
+        A cache miss reads the directory on db, a session on the primary
+        database, or on a session of its own when none is given.
+        """
+        if len(self.shards) == 1:
+            return self.shards[0]
+        shard_id = self._cache.get(user_id)
+        if shard_id is None:
+            if db is not None:
+                shard_id = await db.run_sync(self.lookup, user_id)
+            else:
+                async with AsyncSessionLocal() as directory:
+                    shard_id = await directory.run_sync(self.lookup, user_id)
+        return self.shards[shard_id]
+
+    def forget(self, user_id: int):
+        """Drop a cached route after the user moved"""
+        self._cache.pop(user_id)
+
+    @asynccontextmanager
+    async def session(self, user_id: int, read: bool = False) -> AsyncIterator[AsyncSession]:
+        """Open an async session on a user's shard"""
+        shard = await self.resolve(user_id)
+        factory = shard.AsyncReadSessionLocal if read else shard.AsyncSessionLocal
+        async with factory() as db:
+            yield db
+
+    def sync_session(self, user_id: int) -> Session:
+        """Open a sync session on a user's shard; the caller closes it"""
+        with SessionLocal() as directory:
+            shard_id = self.lookup(directory, user_id)
+        return self.shards[shard_id].SessionLocal()
+
+    async def place_new_user(self, db: AsyncSession, user: User):
+        """Assign a newly registered user to a shard
+
+        db is a session on the primary database.
+        """
+        shard_id = self.shard_for_new_user(user.id)
+        if shard_id == 0:
+            return
+        async with self.shards[shard_id].AsyncSessionLocal() as shard_db:
+            await shard_db.run_sync(crud.ensure_shard_user, user)
+        await db.run_sync(crud.set_user_shard, user.id, shard_id)
+        self._cache.set(user.id, shard_id)
+
+def _build_shards() -> List[Shard]:
+    primary = Shard(0, engine, async_engine, SessionLocal, AsyncSessionLocal, AsyncReadSessionLocal)
+    urls = [url.strip() for url in settings.database_shard_urls.split(",") if url.strip()]
+    return [primary] + [Shard.from_url(shard_id, url) for shard_id, url in enumerate(urls, start=1)]
+
+router = ShardRouter(_build_shards())
+
+def reserve_id_space(shard: Shard):
+    """Start the shard's todo ids at its own range, if not already past it"""
+    start = shard.id * SHARD_ID_SPACE
+    if start == 0:
+        return
+    dialect = shard.engine.dialect.name
+    with shard.engine.begin() as conn:
+        if dialect == "sqlite":
+            conn.execute(
+                text("UPDATE sqlite_sequence SET seq = :start WHERE name = 'todos' AND seq < :start"),
+                {"start": start}
+            )
+            conn.execute(
+                text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT 'todos', :start "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'todos')"
+                ),
+                {"start": start}
+            )
+        elif dialect == "postgresql":
+            conn.execute(
+                text(
+                    "SELECT setval(pg_get_serial_sequence('todos', 'id'), GREATEST(:start, "
+                    "COALESCE(pg_sequence_last_value(pg_get_serial_sequence('todos', 'id')::regclass), 0)))"
+                ),
+                {"start": start}
+            )
+
+def move_user(user_id: int, target_id: int, settle_seconds: Optional[float] = None) -> int:
+    """Move all of a user's todo data to another shard, returning rows moved
+
+    Rows are copied with their ids and committed on the target before the
+    directory is switched. API workers keep routing the user to the source
+    until their cached route expires, so the source rows stay for
+    settle_seconds (USER_CACHE_TTL_SECONDS by default). Todos created or
+    changed there in that window are then carried over, and only then are
+    the source rows deleted. Deletes made through a stale route are not
+    carried over, so run it while the user is idle.
+    """
+    if settle_seconds is None:
+        settle_seconds = settings.user_cache_ttl_seconds
+    with SessionLocal() as directory:
+        router.forget(user_id)
+        source_id = router.lookup(directory, user_id)
+        if source_id == target_id:
+            return 0
+        user = directory.get(User, user_id)
+        if user is None:
+            raise ValueError(f"No user {user_id}")
+
+        source = router.shards[source_id]
+        target = router.shards[target_id]
+        # updated_at has whole seconds on some databases
+        copied_at = datetime.utcnow().replace(microsecond=0)
+        moved = 0
+        with target.SessionLocal() as target_db:
+            if target_id != 0:
+                crud.ensure_shard_user(target_db, user)
+            with source.engine.connect() as source_conn:
+                for table in OWNER_TABLES:
+                    rows = source_conn.execution_options(yield_per=MOVE_CHUNK_SIZE).execute(
+                        select(table).where(table.c.owner_id == user_id)
+                    )
+                    for chunk in rows.mappings().partitions():
+                        target_db.execute(insert(table), [dict(row) for row in chunk])
+                        moved += len(chunk)
+            target_db.commit()
+
+        crud.set_user_shard(directory, user_id, target_id)
+        router.forget(user_id)
+
+    # Let every worker's cached route to the source expire
+    time.sleep(settle_seconds)
+    with target.SessionLocal() as target_db:
+        moved += _carry_over(source, target_db, user_id, copied_at)
+
+    with source.engine.begin() as source_conn:
+        for table in reversed(OWNER_TABLES):
+            source_conn.execute(delete(table).where(table.c.owner_id == user_id))
+    return moved
+
+def _carry_over(source: Shard, target_db: Session, user_id: int, since: datetime) -> int:
+    """Copy todos written to the source through stale routes, returning how many"""
+    carried = 0
+    with source.engine.connect() as source_conn:
+        for table in (Todo.__table__, ArchivedTodo.__table__):
+            present = set(target_db.scalars(select(table.c.id).where(table.c.owner_id == user_id)))
+            rows = [
+                dict(row) for row in source_conn.execute(
+                    select(table).where(table.c.owner_id == user_id)
+                ).mappings()
+                if row["id"] not in present or (row["updated_at"] is not None and row["updated_at"] >= since)
+            ]
+            if rows:
+                target_db.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows])))
+                target_db.execute(insert(table), rows)
+                carried += len(rows)
+    if carried:
+        if settings.todo_counters_enabled:
+            crud.rebuild_todo_counters(target_db, user_id)
+        crud.bump_data_version(target_db, user_id)
+    target_db.commit()
+    return carried
@@ -0,0 +1,76 @@
+"""
+Shared fixtures for backend API tests
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# Point the app at a throwaway database before anything imports database.py
+_db_dir = tempfile.mkdtemp(prefix="todo-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+# Cheap bcrypt so registering users doesn't dominate test time
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+from fastapi.testclient import TestClient
+
+import main
+import manage
+
+manage.migrate_all()
+
+
+class FakeRedis:
+    """Stand-in for a shared store client"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiries = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        if ex is not None:
+            self.expiries[key] = ex
+
+    def incr(self, key):
+        return self.incrby(key, 1)
+
+    def incrby(self, key, amount):
+        self.data[key] = int(self.data.get(key, 0)) + amount
+        return self.data[key]
+
+    def expire(self, key, seconds):
+        self.expiries[key] = seconds
+
+
+@pytest.fixture
+def redis_store():
+    """An empty stand-in for a shared Redis store"""
+    return FakeRedis()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """A test client for the API"""
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Register a fresh user and return their Authorization header"""
+    email = f"user-{uuid.uuid4().hex[:12]}@example.com"
+    password = "secret-password"
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "full_name": "Test User", "password": password},
+    )
+    assert response.status_code == 200
+    response = client.post("/auth/login", params={"email": email, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
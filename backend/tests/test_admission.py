@@ -0,0 +1,92 @@
+"""
+Tests for rate limiting and load shedding
+"""
+import asyncio
+import uuid
+
+import pytest
+
+import admission
+from config import settings
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Admission control with fresh buckets that barely refill"""
+    monkeypatch.setattr(settings, "admission_enabled", True)
+    monkeypatch.setattr(settings, "user_rate_limit", 0.001)
+    monkeypatch.setattr(settings, "user_rate_burst", 5)
+    monkeypatch.setattr(admission, "backend", admission.LocalBackend(100))
+
+
+def test_searches_exhaust_the_users_bucket_first(client, auth_headers, limited):
+    assert client.get("/todos", params={"search": "milk"}, headers=auth_headers).status_code == 200
+    response = client.get("/todos", params={"search": "milk"}, headers=auth_headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Two tokens are left, enough for cheap requests
+    assert client.get("/todos", headers=auth_headers).status_code == 200
+    assert client.get("/auth/me", headers=auth_headers).status_code == 200
+    assert client.get("/todos", headers=auth_headers).status_code == 429
+
+
+def test_users_are_limited_separately(client, auth_headers, limited):
+    for _ in range(5):
+        client.get("/auth/me", headers=auth_headers)
+    assert client.get("/auth/me", headers=auth_headers).status_code == 429
+
+    email = f"other-{uuid.uuid4().hex[:12]}@example.com"
+    client.post("/auth/register", json={"email": email, "full_name": "Other", "password": "secret-password"})
+    token = client.post("/auth/login", params={"email": email, "password": "secret-password"}).json()
+    other = {"Authorization": f"Bearer {token['access_token']}"}
+    assert client.get("/auth/me", headers=other).status_code == 200
+
+
+def test_repeated_logins_are_limited_per_email(client, limited):
+    params = {"email": f"nobody-{uuid.uuid4().hex[:12]}@example.com", "password": "wrong"}
+    assert client.post("/auth/login", params=params).status_code == 401
+    assert client.post("/auth/login", params=params).status_code == 429
+
+
+def test_empty_shared_bucket_sheds_with_503(client, auth_headers, limited, monkeypatch):
+    monkeypatch.setattr(settings, "global_rate_limit", 0.001)
+    monkeypatch.setattr(settings, "global_rate_burst", 1)
+    assert client.get("/").status_code == 200
+    response = client.get("/")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    # Metrics scrapes are never shed
+    assert client.get("/metrics").status_code == 200
+    assert 'todo_requests_shed_total{reason="global_rate"}' in client.get("/metrics").text
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_queues_then_sheds():
+    limiter = admission.ConcurrencyLimiter()
+    await limiter.acquire(limit=1, queue_depth=1, timeout=1)
+
+    waiting = asyncio.create_task(limiter.acquire(limit=1, queue_depth=1, timeout=1))
+    await asyncio.sleep(0)
+    with pytest.raises(admission.Throttled) as shed:
+        await limiter.acquire(limit=1, queue_depth=1, timeout=1)
+    assert shed.value.status_code == 503
+
+    # Releasing hands the slot to the waiter
+    limiter.release()
+    await waiting
+    assert limiter.active == 1
+
+    with pytest.raises(admission.Throttled):
+        await limiter.acquire(limit=1, queue_depth=1, timeout=0.01)
+    limiter.release()
+    assert limiter.active == 0
+
+
+def test_external_backend_allows_burst_per_period(redis_store):
+    backend = admission.ExternalBackend(redis_store)
+    assert backend.take("user:1", 3, rate=1, burst=5) == 0
+    assert backend.take("user:1", 2, rate=1, burst=5) == 0
+    assert backend.take("user:1", 1, rate=1, burst=5) > 0
+    assert backend.take("user:2", 1, rate=1, burst=5) == 0
+    assert all(seconds == 6 for seconds in redis_store.expiries.values())
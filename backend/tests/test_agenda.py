@@ -0,0 +1,103 @@
+"""
+Tests for the due-date agenda
+"""
+from datetime import date
+from zoneinfo import ZoneInfo
+
+import pytest
+from sqlalchemy import event
+
+import crud
+from database import SessionLocal, engine
+
+# Two ISO weeks around the end of summer time in Berlin (25 October)
+RANGE = {"start": "2026-10-19", "end": "2026-11-02", "tz": "Europe/Berlin"}
+
+
+def _create(client, headers, title, due_date):
+    return client.post("/todos", json={"title": title, "due_date": due_date}, headers=headers).json()
+
+
+def _counts(agenda, key, field):
+    return {entry[key]: entry["count"] for entry in agenda[field] if entry["count"]}
+
+
+def test_agenda_buckets_by_the_clients_days(client, auth_headers):
+    # 22:30 UTC is already the next day in Berlin, before and after the change
+    _create(client, auth_headers, "Summer time", "2026-10-20T22:30:00Z")
+    _create(client, auth_headers, "Winter time", "2026-10-25T23:30:00Z")
+    _create(client, auth_headers, "Same day", "2026-10-26T10:00:00Z")
+    _create(client, auth_headers, "Out of range", "2026-11-02T00:00:00Z")
+    done = _create(client, auth_headers, "Done", "2026-10-22T10:00:00Z")
+    client.put(f"/todos/{done['id']}", json={"completed": True}, headers=auth_headers)
+
+    response = client.get("/todos/agenda", params=RANGE, headers=auth_headers)
+    assert response.status_code == 200
+    agenda = response.json()
+    assert agenda["timezone"] == "Europe/Berlin"
+    assert len(agenda["days"]) == 14
+    assert _counts(agenda, "date", "days") == {"2026-10-21": 1, "2026-10-26": 2}
+    assert _counts(agenda, "week_start", "weeks") == {"2026-10-19": 1, "2026-10-26": 2}
+    assert [todo["title"] for todo in agenda["todos"]] == ["Summer time", "Winter time", "Same day"]
+
+    # In UTC the first todo falls on the 20th
+    utc = client.get("/todos/agenda", params=dict(RANGE, tz="UTC"), headers=auth_headers).json()
+    assert _counts(utc, "date", "days") == {"2026-10-20": 1, "2026-10-25": 1, "2026-10-26": 1}
+
+    done_only = client.get(
+        "/todos/agenda", params=dict(RANGE, status="done"), headers=auth_headers
+    ).json()
+    assert [todo["title"] for todo in done_only["todos"]] == ["Done"]
+
+    everything = client.get(
+        "/todos/agenda", params=dict(RANGE, status="all"), headers=auth_headers
+    ).json()
+    assert everything["total"] == 4
+    assert _counts(everything, "date", "days") == {"2026-10-21": 1, "2026-10-22": 1, "2026-10-26": 2}
+    assert [todo["title"] for todo in everything["todos"]] == ["Summer time", "Done", "Winter time", "Same day"]
+
+
+def test_agenda_limit_keeps_full_counts(client, auth_headers):
+    for day in (20, 21, 22):
+        _create(client, auth_headers, f"Due {day}", f"2026-10-{day}T12:00:00Z")
+    agenda = client.get(
+        "/todos/agenda", params=dict(RANGE, limit=1), headers=auth_headers
+    ).json()
+    assert agenda["total"] == 3
+    assert [todo["title"] for todo in agenda["todos"]] == ["Due 20"]
+
+
+def test_agenda_rejects_bad_ranges_and_zones(client, auth_headers):
+    for params in (
+        dict(RANGE, tz="Mars/Olympus_Mons"),
+        dict(RANGE, end=RANGE["start"]),
+        dict(RANGE, end="2027-10-19"),
+        dict(RANGE, limit=0),
+    ):
+        assert client.get("/todos/agenda", params=params, headers=auth_headers).status_code == 400
+    response = client.get("/todos/agenda", params=dict(RANGE, status="someday"), headers=auth_headers)
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("completed", [False, None])
+def test_agenda_queries_are_index_range_scans(completed):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with SessionLocal() as db:
+            crud.get_todo_agenda(db, 1, date(2026, 10, 19), date(2026, 11, 2), ZoneInfo("Europe/Berlin"), completed)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert len(statements) == 2
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = " ".join(
+                row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            )
+            assert "ix_todos_owner_completed_due" in plan
+            assert "due_date>? AND due_date<?" in plan
@@ -0,0 +1,101 @@
+"""
+Tests for archiving completed todos and restoring them
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import archive
+import crud
+import manage
+from database import SessionLocal
+from models import Todo
+
+
+def _finished_long_ago(todo_ids):
+    long_ago = datetime.utcnow() - timedelta(days=400)
+    with SessionLocal() as db:
+        db.execute(
+            update(Todo).where(Todo.id.in_(todo_ids)).values(
+                completed=True, completed_at=long_ago, updated_at=long_ago
+            )
+        )
+        db.commit()
+
+
+def _ids(response):
+    return [todo["id"] for todo in response.json()]
+
+
+@pytest.fixture
+def archived(client, auth_headers):
+    """Three todos, two of them finished long ago and archived"""
+    todos = [
+        client.post("/todos", json={"title": f"Archive me {i}", "category": "work"}, headers=auth_headers).json()
+        for i in range(3)
+    ]
+    old = [todos[0]["id"], todos[1]["id"]]
+    _finished_long_ago(old)
+    with SessionLocal() as db:
+        while crud.archive_completed_todos(db, datetime.utcnow() - timedelta(days=30), 1):
+            pass
+    return old, todos[2]["id"]
+
+
+def test_archived_todos_leave_the_default_list(client, auth_headers, archived):
+    old, hot = archived
+    assert _ids(client.get("/todos", headers=auth_headers)) == [hot]
+    assert client.get(f"/todos/{old[0]}", headers=auth_headers).status_code == 404
+
+    everything = client.get("/todos", params={"include_archived": True}, headers=auth_headers)
+    assert _ids(everything) == [hot] + old[::-1]
+    done = client.get("/todos", params={"include_archived": True, "completed": True}, headers=auth_headers)
+    assert sorted(_ids(done)) == sorted(old)
+    found = client.get(
+        "/todos", params={"include_archived": True, "search": "archive"}, headers=auth_headers
+    )
+    assert len(_ids(found)) == 3
+
+
+def test_stats_count_archive_only_when_asked(client, auth_headers, archived):
+    stats = client.get("/todos/stats/summary", headers=auth_headers).json()
+    assert (stats["total"], stats["completed"]) == (1, 0)
+
+    stats = client.get("/todos/stats/summary", params={"include_archived": True}, headers=auth_headers).json()
+    assert (stats["total"], stats["completed"], stats["active"]) == (3, 2, 1)
+    assert stats["by_category"]["work"] == 3
+
+
+def test_restore_moves_todos_back(client, auth_headers, archived):
+    old, hot = archived
+    response = client.post("/todos/restore", json={"ids": [old[0], hot]}, headers=auth_headers)
+    assert [item["status"] for item in response.json()["results"]] == ["restored", "not_found"]
+
+    restored = client.get(f"/todos/{old[0]}", headers=auth_headers).json()
+    assert restored["completed"] is True
+    assert sorted(_ids(client.get("/todos", headers=auth_headers))) == sorted([old[0], hot])
+
+    # A restored todo counts as recently changed and stays hot
+    with SessionLocal() as db:
+        crud.archive_completed_todos(db, datetime.utcnow() - timedelta(days=30), 10)
+    assert client.get(f"/todos/{old[0]}", headers=auth_headers).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_background_compaction_runs_in_batches(client, auth_headers):
+    ids = [
+        client.post("/todos", json={"title": f"Batch {i}"}, headers=auth_headers).json()["id"]
+        for i in range(5)
+    ]
+    _finished_long_ago(ids)
+    assert await archive.compact(after_days=30, batch_size=2) == 5
+    assert client.get("/todos", headers=auth_headers).json() == []
+
+
+def test_manage_restore(client, auth_headers, archived, capsys):
+    old, _ = archived
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    assert manage.main(["archive", "restore", "--user-id", str(user_id), str(old[1])]) == 0
+    assert "1 todo(s) restored" in capsys.readouterr().out
+    assert client.get(f"/todos/{old[1]}", headers=auth_headers).status_code == 200
@@ -0,0 +1,38 @@
+"""
+Tests for the async database path used by the API routes
+"""
+import asyncio
+
+import httpx
+import pytest
+
+import async_crud
+import main
+from database import AsyncSessionLocal
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_the_event_loop(client, auth_headers):
+    """Concurrent requests are served on one loop through async sessions"""
+    async with httpx.AsyncClient(app=main.app, base_url="http://test") as async_client:
+        for i in range(5):
+            await async_client.post("/todos", json={"title": f"Async {i}"}, headers=auth_headers)
+        responses = await asyncio.gather(
+            *[async_client.get("/todos", headers=auth_headers) for _ in range(10)]
+        )
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(len(response.json()) == 5 for response in responses)
+
+
+@pytest.mark.asyncio
+async def test_async_crud_matches_sync_crud(client, auth_headers):
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    client.post("/todos", json={"title": "Through run_sync"}, headers=auth_headers)
+
+    async with AsyncSessionLocal() as db:
+        todos = await async_crud.get_todos(db, user_id=user_id)
+        stats = await async_crud.get_todo_stats(db, user_id=user_id)
+
+    assert [todo.title for todo in todos] == ["Through run_sync"]
+    assert stats["total"] == 1
@@ -0,0 +1,41 @@
+"""
+Tests for the authenticated-user cache in get_current_user
+"""
+from jose import jwt
+
+import auth
+from database import SessionLocal
+from models import User
+
+
+def _user_id(client, headers):
+    return client.get("/auth/me", headers=headers).json()["id"]
+
+
+def test_token_carries_user_id(client, auth_headers):
+    token = auth_headers["Authorization"].split()[1]
+    payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    assert payload["user_id"] == _user_id(client, auth_headers)
+
+
+def test_cached_user_is_dropped_on_change(client, auth_headers):
+    """Deactivating a user invalidates the cache, so their token stops working"""
+    user_id = _user_id(client, auth_headers)
+    assert auth.user_cache.get(user_id) is not None
+
+    db = SessionLocal()
+    try:
+        db.get(User, user_id).is_active = False
+        db.commit()
+    finally:
+        db.close()
+
+    assert auth.user_cache.get(user_id) is None
+    assert client.get("/auth/me", headers=auth_headers).status_code == 401
+
+
+def test_legacy_token_without_user_id(client, auth_headers):
+    email = client.get("/auth/me", headers=auth_headers).json()["email"]
+    token = auth.create_access_token(data={"sub": email})
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
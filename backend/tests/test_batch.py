@@ -0,0 +1,156 @@
+"""
+Tests for the /todos/batch endpoints
+"""
+import uuid
+
+import pytest
+
+import crud
+from config import settings
+from database import SessionLocal
+
+
+def _todos(client, headers):
+    return {todo["id"]: todo for todo in client.get("/todos", headers=headers).json()}
+
+
+def test_batch_create_update_delete(client, auth_headers):
+    response = client.post(
+        "/todos/batch",
+        json={"todos": [{"title": f"Imported {i}", "category": "work"} for i in range(4)]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    ids = [result["id"] for result in response.json()["results"]]
+    todos = _todos(client, auth_headers)
+    assert [todos[todo_id]["title"] for todo_id in ids] == [f"Imported {i}" for i in range(4)]
+
+    response = client.patch(
+        "/todos/batch",
+        json={"updates": [
+            {"id": ids[0], "completed": True},
+            {"id": ids[1], "title": "Renamed", "priority": "high"},
+            {"id": 999999, "completed": True},
+        ]},
+        headers=auth_headers,
+    )
+    assert [result["status"] for result in response.json()["results"]] == [
+        "updated", "updated", "not_found"
+    ]
+    todos = _todos(client, auth_headers)
+    assert todos[ids[0]]["completed"] and todos[ids[0]]["completed_at"]
+    assert todos[ids[1]]["title"] == "Renamed"
+    assert todos[ids[1]]["priority"] == "high"
+
+    response = client.post(
+        "/todos/batch/delete", json={"ids": [ids[2], 999999]}, headers=auth_headers
+    )
+    assert [result["status"] for result in response.json()["results"]] == ["deleted", "not_found"]
+    assert ids[2] not in _todos(client, auth_headers)
+
+
+def test_batch_cannot_touch_other_users_todos(client, auth_headers):
+    todo_id = client.post("/todos", json={"title": "Mine"}, headers=auth_headers).json()["id"]
+    email = f"batch-other-{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post(
+        "/auth/register",
+        json={"email": email, "full_name": "Other", "password": "secret-password"},
+    )
+    assert response.status_code == 200
+    token = client.post(
+        "/auth/login", params={"email": email, "password": "secret-password"}
+    ).json()["access_token"]
+    other_headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post("/todos/batch/delete", json={"ids": [todo_id]}, headers=other_headers)
+    assert response.json()["results"][0]["status"] == "not_found"
+    assert todo_id in _todos(client, auth_headers)
+
+
+@pytest.mark.parametrize("counters", [False, True])
+def test_batch_where(client, auth_headers, monkeypatch, counters):
+    monkeypatch.setattr(settings, "todo_counters_enabled", counters)
+    client.post(
+        "/todos/batch",
+        json={"todos": [
+            {"title": "A", "category": "work"},
+            {"title": "B", "category": "work"},
+            {"title": "C", "category": "shopping"},
+        ]},
+        headers=auth_headers,
+    )
+
+    response = client.post(
+        "/todos/batch/where",
+        json={"filter": {"category": "work"}, "action": "complete"},
+        headers=auth_headers,
+    )
+    assert response.json() == {"affected": 2}
+
+    response = client.post(
+        "/todos/batch/where",
+        json={"filter": {"completed": True}, "action": "delete"},
+        headers=auth_headers,
+    )
+    assert response.json() == {"affected": 2}
+
+    stats = client.get("/todos/stats/summary", headers=auth_headers).json()
+    assert stats["total"] == 1
+    assert stats["completed"] == 0
+
+
+def test_batch_writes_keep_counters_in_step(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "todo_counters_enabled", True)
+    # Builds the counters, which every later batch then adjusts
+    client.get("/todos/stats/summary", headers=auth_headers)
+    ids = [
+        result["id"] for result in client.post(
+            "/todos/batch",
+            json={"todos": [
+                {"title": "A", "category": "work", "priority": "high"},
+                {"title": "B", "category": "work"},
+                {"title": "C", "category": "health", "completed": True},
+            ]},
+            headers=auth_headers,
+        ).json()["results"]
+    ]
+    client.patch(
+        "/todos/batch",
+        json={"updates": [
+            {"id": ids[0], "category": "shopping", "completed": True},
+            {"id": ids[0], "priority": "low"},
+            {"id": ids[2], "completed": False},
+        ]},
+        headers=auth_headers,
+    )
+    client.post("/todos/batch/delete", json={"ids": [ids[1]]}, headers=auth_headers)
+
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    with SessionLocal() as db:
+        assert crud.verify_todo_counters(db, user_id) == {}
+    stats = client.get("/todos/stats/summary", headers=auth_headers).json()
+    assert stats["total"] == 2
+    assert stats["completed"] == 1
+    assert stats["by_priority"] == {"low": 1, "medium": 1, "high": 0}
+
+
+def test_repeated_ids_update_in_request_order(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "todo_counters_enabled", True)
+    todo_id = client.post("/todos", json={"title": "Toggled"}, headers=auth_headers).json()["id"]
+    response = client.patch(
+        "/todos/batch",
+        json={"updates": [
+            {"id": todo_id, "completed": True},
+            {"id": todo_id, "completed": False, "title": "Renamed"},
+            {"id": todo_id, "completed": True},
+        ]},
+        headers=auth_headers,
+    )
+    assert [result["status"] for result in response.json()["results"]] == ["updated"] * 3
+
+    todo = _todos(client, auth_headers)[todo_id]
+    assert todo["title"] == "Renamed"
+    assert todo["completed"] and todo["completed_at"]
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    with SessionLocal() as db:
+        assert crud.verify_todo_counters(db, user_id) == {}
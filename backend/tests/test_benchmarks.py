@@ -0,0 +1,62 @@
+"""
+Keep the benchmark harness runnable against a tiny dataset
+"""
+import re
+
+import pytest
+from fastapi.routing import APIRoute, APIWebSocketRoute
+
+import main
+from benchmarks import run, startup
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert run.percentile(values, 50) == 50
+    assert run.percentile(values, 95) == 95
+    assert run.percentile(values, 99) == 99
+    assert run.percentile([], 50) == 0.0
+
+
+def test_scenarios_cover_every_route():
+    routes = set()
+    for route in main.app.routes:
+        if isinstance(route, APIWebSocketRoute):
+            routes.add(f"WS {route.path}")
+        elif isinstance(route, APIRoute):
+            # Scenario names call every path parameter {id}
+            path = re.sub(r"\{\w+\}", "{id}", route.path)
+            routes |= {f"{method} {path}" for method in route.methods}
+    # Variants such as "GET /todos (search)" drive the same route
+    driven = {name.split(" (")[0] for name in run._scenarios()}
+    assert routes - set(run.UNDRIVEN_ROUTES) == driven
+
+
+@pytest.mark.asyncio
+async def test_harness_runs_every_scenario(client):
+    report = await run.run_benchmark(users=2, todos_per_user=30, requests=3, concurrency=2)
+    assert set(report["endpoints"]) == set(run._scenarios())
+    assert all(result["errors"] == 0 for result in report["endpoints"].values())
+
+    assert run.compare(report, report, threshold=10) == []
+    slower = {"endpoints": {"GET /todos": dict(report["endpoints"]["GET /todos"], p95_ms=1e9)}}
+    assert run.compare(report, slower, threshold=10) == ["GET /todos"]
+
+
+def test_parse_importtime():
+    output = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     jose.jwt",
+        "import time:      2000 |       2120 |   auth",
+    ])
+    assert startup.parse_importtime(output) == [
+        {"module": "jose.jwt", "self_ms": 0.12, "cumulative_ms": 0.12, "depth": 2},
+        {"module": "auth", "self_ms": 2.0, "cumulative_ms": 2.12, "depth": 1},
+    ]
+
+
+def test_app_starts_without_deferred_modules():
+    report = startup.profile(runs=1, top=5)
+    assert report["deferred_loaded"] == []
+    assert report["import_ms"] > 0
+    assert len(report["slowest_imports"]) == 5
@@ -0,0 +1,48 @@
+"""
+Tests for ETag / conditional GET support
+"""
+
+
+def test_list_etag_changes_only_on_mutation(client, auth_headers):
+    todo = client.post("/todos", json={"title": "Versioned"}, headers=auth_headers).json()
+
+    first = client.get("/todos", headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+
+    again = client.get("/todos", headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+    client.put(f"/todos/{todo['id']}", json={"completed": True}, headers=auth_headers)
+    changed = client.get("/todos", headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_single_todo_and_stats_are_conditional(client, auth_headers):
+    todo = client.post("/todos", json={"title": "Versioned"}, headers=auth_headers).json()
+    for path in (f"/todos/{todo['id']}", "/todos/stats/summary"):
+        etag = client.get(path, headers=auth_headers).headers["ETag"]
+        response = client.get(path, headers=dict(auth_headers, **{"If-None-Match": etag}))
+        assert response.status_code == 304
+
+    client.post("/todos/batch/where", json={"action": "delete"}, headers=auth_headers)
+    response = client.get("/todos/stats/summary", headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert response.status_code == 200
+    assert response.json()["total"] == 0
+
+
+def test_etags_are_per_user(client, auth_headers):
+    etag = client.get("/todos", headers=auth_headers).headers["ETag"]
+    client.post(
+        "/auth/register",
+        json={"email": "etag-other@example.com", "full_name": "Other", "password": "secret-password"},
+    )
+    token = client.post(
+        "/auth/login", params={"email": "etag-other@example.com", "password": "secret-password"}
+    ).json()["access_token"]
+    response = client.get(
+        "/todos", headers={"Authorization": f"Bearer {token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 200
@@ -0,0 +1,39 @@
+"""
+Tests for the engine profile in database.py
+"""
+import pytest
+from sqlalchemy import text
+
+from database import (
+    TimedAsyncAdaptedQueuePool, TimedQueuePool, async_engine, engine, engine_options
+)
+
+
+def test_sqlite_pragmas_applied_on_connect():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+@pytest.mark.asyncio
+async def test_async_engine_gets_the_same_pragmas():
+    async with async_engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+
+
+def test_in_memory_sqlite_has_no_pool_options():
+    options = engine_options("sqlite://")
+    assert "pool_size" not in options
+    assert options["connect_args"] == {"check_same_thread": False}
+
+
+def test_asyncpg_gets_prepared_statement_cache():
+    options = engine_options("postgresql://user@localhost/todos", is_async=True)
+    assert options["connect_args"] == {"prepared_statement_cache_size": 100}
+    assert options["pool_pre_ping"] is True
+
+
+def test_pooled_engines_time_checkouts():
+    assert isinstance(engine.pool, TimedQueuePool)
+    assert isinstance(async_engine.sync_engine.pool, TimedAsyncAdaptedQueuePool)
@@ -0,0 +1,57 @@
+"""
+Tests for the real-time todo change feed
+"""
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+
+def _token(headers):
+    return headers["Authorization"].split()[1]
+
+
+def test_feed_pushes_changes_with_stats_deltas(client, auth_headers):
+    with client.websocket_connect(f"/ws/todos?token={_token(auth_headers)}") as ws:
+        assert ws.receive_json() == {"type": "ready", "version": 0}
+
+        todo = client.post("/todos", json={"title": "Live", "priority": "high"}, headers=auth_headers).json()
+        event = ws.receive_json()
+        assert event["type"] == "todo.created"
+        assert event["version"] == 1
+        assert event["todo"] == todo
+        assert event["stats_delta"] == {
+            "total": 1, "completed": 0, "active": 1,
+            "by_priority": {"high": 1}, "by_category": {"personal": 1},
+        }
+
+        client.put(f"/todos/{todo['id']}", json={"completed": True}, headers=auth_headers)
+        event = ws.receive_json()
+        assert event["type"] == "todo.updated"
+        assert event["stats_delta"]["completed"] == 1
+        assert event["stats_delta"]["total"] == 0
+
+        client.delete(f"/todos/{todo['id']}", headers=auth_headers)
+        event = ws.receive_json()
+        assert (event["type"], event["id"], event["version"]) == ("todo.deleted", todo["id"], 3)
+
+
+def test_reconnect_replays_missed_events(client, auth_headers):
+    client.post("/todos", json={"title": "Before"}, headers=auth_headers)
+    client.post("/todos/batch", json={"todos": [{"title": "A"}, {"title": "B"}]}, headers=auth_headers)
+
+    with client.websocket_connect(f"/ws/todos?token={_token(auth_headers)}&since=1") as ws:
+        event = ws.receive_json()
+        assert (event["type"], event["version"]) == ("todos.created", 2)
+        assert ws.receive_json() == {"type": "ready", "version": 2}
+
+
+def test_unknown_history_asks_for_resync(client, auth_headers):
+    client.post("/todos", json={"title": "Before"}, headers=auth_headers)
+    with client.websocket_connect(f"/ws/todos?token={_token(auth_headers)}&since=7") as ws:
+        assert ws.receive_json() == {"type": "resync", "version": 1}
+        assert ws.receive_json() == {"type": "ready", "version": 1}
+
+
+def test_feed_requires_a_valid_token(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws/todos?token=nope") as ws:
+            ws.receive_json()
@@ -0,0 +1,48 @@
+"""
+Tests for off-loop password hashing
+"""
+import hashing
+from config import settings
+from database import SessionLocal
+from models import User
+
+
+def _register(client, email):
+    return client.post(
+        "/auth/register",
+        json={"email": email, "full_name": "Hash Test", "password": "secret-password"},
+    )
+
+
+def _stored_hash(email):
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.email == email).one().hashed_password
+    finally:
+        db.close()
+
+
+def test_login_rehashes_when_cost_changes(client, monkeypatch):
+    email = "rehash@example.com"
+    assert _register(client, email).status_code == 200
+    assert _stored_hash(email).startswith("$2b$04$")
+
+    monkeypatch.setattr(hashing, "_context", hashing.build_context(5))
+    response = client.post("/auth/login", params={"email": email, "password": "secret-password"})
+    assert response.status_code == 200
+    assert _stored_hash(email).startswith("$2b$05$")
+
+
+def test_wrong_password_is_rejected(client):
+    email = "wrong-password@example.com"
+    _register(client, email)
+    response = client.post("/auth/login", params={"email": email, "password": "not-it"})
+    assert response.status_code == 401
+
+
+def test_saturated_pool_sheds_with_503(client, monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_workers", 0)
+    monkeypatch.setattr(settings, "password_hash_queue_depth", 0)
+    response = _register(client, "shed@example.com")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
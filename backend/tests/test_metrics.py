@@ -0,0 +1,88 @@
+"""
+Tests for request and SQL metrics
+"""
+import logging
+
+import pytest
+
+from sqlalchemy import text
+
+import auth
+import metrics
+from config import settings
+from database import engine
+
+
+def _sample(body, prefix):
+    """Value of the first exposition line starting with prefix"""
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_metrics_endpoint_reports_route_templates(client, auth_headers):
+    todo = client.post("/todos", json={"title": "Measured"}, headers=auth_headers).json()
+    client.get(f"/todos/{todo['id']}", headers=auth_headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE todo_http_request_duration_seconds histogram" in body
+    assert 'route="/todos/{todo_id}"' in body
+    assert f'route="/todos/{todo["id"]}"' not in body
+    assert _sample(body, 'todo_db_statements_per_request_count{route="/todos/{todo_id}"}') >= 1
+
+
+def test_sql_statements_are_counted_per_request(client, auth_headers):
+    client.get("/todos", headers=auth_headers)
+    before = _sample(client.get("/metrics").text, 'todo_db_statements_per_request_sum{route="/todos"}')
+    client.get("/todos", headers=auth_headers)
+    after = _sample(client.get("/metrics").text, 'todo_db_statements_per_request_sum{route="/todos"}')
+    # At least the data version lookup and the todo query
+    assert after - before >= 2
+
+
+def test_slow_queries_are_logged(monkeypatch, caplog):
+    metrics.instrument_engine(engine)
+    monkeypatch.setattr(settings, "slow_query_ms", 0)
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 42"))
+    assert any("SELECT 42" in record.getMessage() for record in caplog.records)
+    assert "todo_db_slow_queries_total" in metrics.registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = metrics.Registry()
+    registry.histogram("latency", "test", (0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        registry.observe("latency", value, route="/x")
+    body = registry.render()
+    assert 'latency_bucket{route="/x",le="0.1"} 1' in body
+    assert 'latency_bucket{route="/x",le="1.0"} 2' in body
+    assert 'latency_bucket{route="/x",le="+Inf"} 3' in body
+    assert 'latency_count{route="/x"} 3' in body
+
+
+@pytest.mark.parametrize("method, route, body", [
+    ("GET", "/todos", None),
+    ("POST", "/todos/import", b'{"title": "Imported"}\n'),
+])
+def test_auth_and_handler_share_one_connection(client, auth_headers, method, route, body):
+    # A cache miss makes auth query the users table on the request's session
+    auth.user_cache.clear()
+    prefix = f'todo_db_pool_checkouts_per_request_sum{{route="{route}"}}'
+    before = _sample(client.get("/metrics").text, prefix) or 0
+    assert client.request(method, route, content=body, headers=auth_headers).status_code == 200
+    after = _sample(client.get("/metrics").text, prefix)
+    assert after - before == 1
+
+
+def test_pool_checkout_waits_are_recorded():
+    before = _sample(metrics.registry.render(), "todo_db_pool_wait_seconds_count") or 0
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    after = _sample(metrics.registry.render(), "todo_db_pool_wait_seconds_count")
+    assert after == before + 1
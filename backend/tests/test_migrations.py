@@ -0,0 +1,133 @@
+"""
+Tests for the Alembic schema migrations
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import inspect, text
+
+import crud
+import manage
+import shards
+from benchmarks.startup import BACKEND_DIR
+from models import Base
+from schemas import TodoCreate
+
+
+# The schema the original app created at import, as in the committed todos.db
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER NOT NULL, email VARCHAR NOT NULL, full_name VARCHAR NOT NULL, "
+    "hashed_password VARCHAR NOT NULL, is_active BOOLEAN, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), "
+    "updated_at DATETIME, PRIMARY KEY (id))",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE TABLE todos (id INTEGER NOT NULL, title VARCHAR NOT NULL, description TEXT, "
+    "completed BOOLEAN NOT NULL, priority VARCHAR(6) NOT NULL, category VARCHAR(8) NOT NULL, "
+    "due_date DATETIME, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME, "
+    "completed_at DATETIME, owner_id INTEGER NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(owner_id) REFERENCES users (id))",
+    "CREATE INDEX ix_todos_id ON todos (id)",
+    "CREATE INDEX ix_todos_title ON todos (title)",
+]
+
+
+def _shard():
+    path = os.path.join(tempfile.mkdtemp(prefix="todo-migrate-"), "todos.db")
+    return shards.Shard.from_url(0, f"sqlite:///{path}")
+
+
+def _legacy_shard():
+    shard = _shard()
+    with shard.engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    return shard
+
+
+def _migration_context(conn):
+    return MigrationContext.configure(conn, opts={
+        "include_object": lambda obj, name, type_, *args: not name.startswith("todos_fts"),
+    })
+
+
+def test_migrations_build_the_models_schema():
+    shard = _shard()
+    assert manage.migrate_shard(shard) == "0004"
+    with shard.engine.connect() as conn:
+        assert compare_metadata(_migration_context(conn), Base.metadata) == []
+        assert inspect(conn).has_table("todos_fts")
+
+
+def test_legacy_database_is_brought_up_to_date():
+    shard = _legacy_shard()
+    with shard.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, email, full_name, hashed_password, is_active) "
+            "VALUES (1, 'legacy@example.com', 'Legacy', 'x', 1)"
+        ))
+        conn.execute(text(
+            "INSERT INTO todos (id, title, completed, priority, category, owner_id) "
+            "VALUES (1, 'Water the plants', 0, 'MEDIUM', 'PERSONAL', 1)"
+        ))
+    assert manage.migrate_shard(shard) == "0004"
+    with shard.engine.connect() as conn:
+        assert compare_metadata(_migration_context(conn), Base.metadata) == []
+        # Todos from before the search index existed are indexed
+        assert conn.execute(text("SELECT rowid FROM todos_fts WHERE todos_fts MATCH 'plants'")).scalar() == 1
+
+    with shard.SessionLocal() as db:
+        todo = crud.create_todo(db, TodoCreate(title="New"), 1)
+        assert todo.id == 2
+        assert crud.get_data_version(db, 1)[0] == 1
+        assert [row.id for row in crud.get_todos(db, 1)] == [2, 1]
+    # Running again is a no-op
+    assert manage.migrate_shard(shard) == "0004"
+
+
+def test_schema_created_at_import_by_a_later_version_is_completed():
+    shard = _shard()
+    Base.metadata.create_all(bind=shard.engine)
+    with shard.engine.begin() as conn:
+        # Added after the app stopped creating its schema at import
+        conn.execute(text("DROP INDEX ix_todos_owner_completed_due"))
+        # Versions before sharding had no shard directory
+        conn.execute(text("DROP TABLE user_shards"))
+    assert manage.migrate_shard(shard) == "0004"
+    with shard.engine.connect() as conn:
+        assert compare_metadata(_migration_context(conn), Base.metadata) == []
+        assert inspect(conn).has_table("todos_fts")
+
+
+def test_todo_ids_are_not_reused_after_archiving():
+    shard = _legacy_shard()
+    manage.migrate_shard(shard, "0002")
+    with shard.engine.begin() as conn:
+        # The newest todo was archived while todos had no AUTOINCREMENT
+        conn.execute(text(
+            "INSERT INTO todos (id, title, completed, priority, category, owner_id) "
+            "VALUES (1, 'Hot', 0, 'MEDIUM', 'WORK', 1)"
+        ))
+        conn.execute(text(
+            "INSERT INTO archived_todos (id, title, completed, priority, category, owner_id) "
+            "VALUES (2, 'Archived', 1, 'MEDIUM', 'WORK', 1)"
+        ))
+    assert manage.migrate_shard(shard) == "0004"
+    with shard.engine.begin() as conn:
+        new_id = conn.execute(text(
+            "INSERT INTO todos (title, completed, priority, category, owner_id) "
+            "VALUES ('New', 0, 'MEDIUM', 'WORK', 1) RETURNING id"
+        )).scalar()
+        assert new_id == 3
+        # The search triggers were recreated with the table
+        assert conn.execute(text("SELECT rowid FROM todos_fts WHERE todos_fts MATCH 'new'")).scalar() == 3
+
+
+def test_importing_the_app_leaves_the_database_alone(tmp_path):
+    path = tmp_path / "untouched.db"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, env=env, check=True)
+    assert not path.exists()
@@ -0,0 +1,85 @@
+"""
+Tests for single-statement todo update and delete
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import crud
+from config import settings
+from database import SessionLocal, async_engine
+
+
+@contextmanager
+def _statements():
+    """Collect the SQL statements the async engine runs"""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+def test_toggle_is_one_statement(client, auth_headers):
+    todo = client.post("/todos", json={"title": "Toggle"}, headers=auth_headers).json()
+    client.get("/auth/me", headers=auth_headers)  # warm the user cache
+
+    with _statements() as statements:
+        response = client.put(f"/todos/{todo['id']}", json={"completed": True}, headers=auth_headers)
+    assert response.status_code == 200
+    touching_todos = [s for s in statements if "FROM todos" in s or s.startswith(("UPDATE todos", "SELECT todos"))]
+    assert len(touching_todos) == 1
+    assert touching_todos[0].startswith("UPDATE todos")
+
+
+def test_completed_at_transitions(client, auth_headers):
+    todo = client.post("/todos", json={"title": "Done"}, headers=auth_headers).json()
+    url = f"/todos/{todo['id']}"
+
+    completed = client.put(url, json={"completed": True}, headers=auth_headers).json()
+    assert completed["completed"] is True
+    assert completed["completed_at"] is not None
+
+    # Completing again keeps the original timestamp
+    again = client.put(url, json={"completed": True, "title": "Renamed"}, headers=auth_headers).json()
+    assert again["completed_at"] == completed["completed_at"]
+    assert again["title"] == "Renamed"
+
+    reopened = client.put(url, json={"completed": False}, headers=auth_headers).json()
+    assert reopened["completed"] is False
+    assert reopened["completed_at"] is None
+
+
+def test_mutations_are_owner_scoped(client, auth_headers):
+    todo = client.post("/todos", json={"title": "Mine"}, headers=auth_headers).json()
+    client.post("/auth/register", json={"email": "intruder@example.com", "full_name": "I", "password": "secret123"})
+    token = client.post("/auth/login", params={"email": "intruder@example.com", "password": "secret123"}).json()
+    other = {"Authorization": f"Bearer {token['access_token']}"}
+
+    assert client.put(f"/todos/{todo['id']}", json={"title": "x"}, headers=other).status_code == 404
+    assert client.delete(f"/todos/{todo['id']}", headers=other).status_code == 404
+    assert client.get(f"/todos/{todo['id']}", headers=auth_headers).json()["title"] == "Mine"
+
+    assert client.delete(f"/todos/{todo['id']}", headers=auth_headers).status_code == 200
+    assert client.delete(f"/todos/{todo['id']}", headers=auth_headers).status_code == 404
+
+
+def test_counters_follow_single_statement_mutations(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "todo_counters_enabled", True)
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    todo = client.post("/todos", json={"title": "Counted"}, headers=auth_headers).json()
+    client.put(f"/todos/{todo['id']}", json={"completed": True, "priority": "high"}, headers=auth_headers)
+    client.put(f"/todos/{todo['id']}", json={"category": "work"}, headers=auth_headers)
+    other = client.post("/todos", json={"title": "Gone"}, headers=auth_headers).json()
+    client.delete(f"/todos/{other['id']}", headers=auth_headers)
+
+    with SessionLocal() as db:
+        assert crud.verify_todo_counters(db, user_id) == {}
+    stats = client.get("/todos/stats/summary", headers=auth_headers).json()
+    assert stats["completed"] == 1
+    assert stats["by_priority"]["high"] == 1
@@ -0,0 +1,45 @@
+"""
+Tests for keyset (cursor) pagination of GET /todos
+"""
+
+
+def _create(client, headers, count, **fields):
+    for i in range(count):
+        response = client.post("/todos", json={"title": f"Todo {i}", **fields}, headers=headers)
+        assert response.status_code == 200
+
+
+def _walk(client, headers, **params):
+    seen = []
+    cursor = None
+    while True:
+        query = dict(params, limit=3)
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/todos", params=query, headers=headers)
+        assert response.status_code == 200
+        seen += [todo["id"] for todo in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+
+
+def test_cursor_pages_match_offset_order(client, auth_headers):
+    """Walking with cursors returns every todo once, in list order"""
+    _create(client, auth_headers, 8)
+    expected = [todo["id"] for todo in client.get("/todos", headers=auth_headers).json()]
+    assert _walk(client, auth_headers) == expected
+    assert len(expected) == 8
+
+
+def test_cursor_composes_with_filters(client, auth_headers):
+    """Cursors respect the category filter"""
+    _create(client, auth_headers, 4, category="work")
+    _create(client, auth_headers, 5, category="shopping")
+    ids = _walk(client, auth_headers, category="shopping")
+    assert len(ids) == len(set(ids)) == 5
+
+
+def test_invalid_cursor(client, auth_headers):
+    response = client.get("/todos", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
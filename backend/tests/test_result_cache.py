@@ -0,0 +1,64 @@
+"""
+Tests for the GET /todos result cache
+"""
+import pytest
+
+import result_cache
+from config import settings
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    monkeypatch.setattr(settings, "result_cache_enabled", True)
+    return result_cache.cache
+
+
+def test_repeated_queries_hit_the_cache(client, auth_headers, cached):
+    client.post("/todos", json={"title": "Cached", "category": "work"}, headers=auth_headers)
+    params = {"category": "work"}
+
+    hits, misses = cached.hits, cached.misses
+    first = client.get("/todos", params=params, headers=auth_headers)
+    second = client.get("/todos", params=params, headers=auth_headers)
+    assert (cached.hits - hits, cached.misses - misses) == (1, 1)
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+    # Different filters are cached separately
+    client.get("/todos", params={"category": "home"}, headers=auth_headers)
+    assert cached.misses - misses == 2
+
+
+def test_mutations_invalidate_the_users_pages(client, auth_headers, cached):
+    todo = client.post("/todos", json={"title": "Before"}, headers=auth_headers).json()
+    client.get("/todos", headers=auth_headers)
+
+    client.put(f"/todos/{todo['id']}", json={"title": "After"}, headers=auth_headers)
+    assert client.get("/todos", headers=auth_headers).json()[0]["title"] == "After"
+
+    client.post("/todos/batch/where", json={"action": "complete"}, headers=auth_headers)
+    assert client.get("/todos", headers=auth_headers).json()[0]["completed"] is True
+
+
+def test_cached_pages_keep_the_cursor(client, auth_headers, cached):
+    for i in range(3):
+        client.post("/todos", json={"title": f"Page {i}"}, headers=auth_headers)
+    first = client.get("/todos", params={"limit": 2}, headers=auth_headers)
+    again = client.get("/todos", params={"limit": 2}, headers=auth_headers)
+    assert again.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+
+
+def test_external_backend(client, auth_headers, cached, monkeypatch, redis_store):
+    monkeypatch.setattr(cached, "backend", result_cache.ExternalBackend(redis_store))
+    client.post("/todos", json={"title": "Shared"}, headers=auth_headers)
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+
+    hits = cached.hits
+    client.get("/todos", headers=auth_headers)
+    client.get("/todos", headers=auth_headers)
+    assert cached.hits - hits == 1
+    assert any(key.startswith(f"todo-api:todos:{user_id}:") for key in redis_store.data)
+
+    client.post("/todos", json={"title": "Second"}, headers=auth_headers)
+    assert redis_store.data[f"todo-api:gen:{user_id}"] >= 1
+    assert len(client.get("/todos", headers=auth_headers).json()) == 2
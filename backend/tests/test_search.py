@@ -0,0 +1,47 @@
+"""
+Tests for full-text todo search
+"""
+
+
+def _titles(client, headers, search, **params):
+    response = client.get("/todos", params={"search": search, **params}, headers=headers)
+    assert response.status_code == 200
+    return [todo["title"] for todo in response.json()]
+
+
+def test_search_prefix_and_ranking(client, auth_headers):
+    """Partial words match, and todos matching more often rank first"""
+    for todo in [
+        {"title": "Buy milk", "description": "Semi-skimmed"},
+        {"title": "Call the bank"},
+        {"title": "Milk the cows", "description": "Milk twice before breakfast, milk again at night"},
+    ]:
+        client.post("/todos", json=todo, headers=auth_headers)
+
+    assert _titles(client, auth_headers, "mil") == ["Milk the cows", "Buy milk"]
+    assert _titles(client, auth_headers, "milk semi") == ["Buy milk"]
+    assert _titles(client, auth_headers, "bank") == ["Call the bank"]
+
+
+def test_search_follows_updates_and_deletes(client, auth_headers):
+    """The index tracks title changes and deleted todos"""
+    todo = client.post("/todos", json={"title": "Water plants"}, headers=auth_headers).json()
+    client.put(f"/todos/{todo['id']}", json={"title": "Feed the cat"}, headers=auth_headers)
+    assert _titles(client, auth_headers, "water") == []
+    assert _titles(client, auth_headers, "cat") == ["Feed the cat"]
+
+    client.delete(f"/todos/{todo['id']}", headers=auth_headers)
+    assert _titles(client, auth_headers, "cat") == []
+
+
+def test_search_is_owner_scoped(client, auth_headers):
+    client.post("/todos", json={"title": "Private zebra"}, headers=auth_headers)
+    other = client.post(
+        "/auth/register",
+        json={"email": "zebra-other@example.com", "full_name": "Other", "password": "secret-password"},
+    )
+    assert other.status_code == 200
+    token = client.post(
+        "/auth/login", params={"email": "zebra-other@example.com", "password": "secret-password"}
+    ).json()["access_token"]
+    assert _titles(client, {"Authorization": f"Bearer {token}"}, "zebra") == []
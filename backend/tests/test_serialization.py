@@ -0,0 +1,106 @@
+"""
+Tests for the fast GET /todos serialization path and sparse fieldsets
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import serialization
+from config import settings
+
+
+@pytest.fixture
+def fast_path(monkeypatch):
+    monkeypatch.setattr(settings, "fast_todo_serialization", True)
+
+
+def _seed(client, headers):
+    client.post("/todos", json={"title": "Plain"}, headers=headers)
+    client.post("/todos", json={
+        "title": "Ünïcode \"quoted\"",
+        "description": "line\nbreak",
+        "priority": "high",
+        "category": "work",
+        "due_date": "2030-05-01T09:30:00",
+    }, headers=headers)
+    todo = client.post("/todos", json={"title": "Done"}, headers=headers).json()
+    client.put(f"/todos/{todo['id']}", json={"completed": True}, headers=headers)
+
+
+def test_fast_path_matches_model_response(client, auth_headers, monkeypatch):
+    _seed(client, auth_headers)
+    regular = client.get("/todos", headers=auth_headers)
+
+    monkeypatch.setattr(settings, "fast_todo_serialization", True)
+    fast = client.get("/todos", headers=auth_headers)
+
+    assert fast.status_code == 200
+    assert fast.content == regular.content
+    assert fast.headers["content-type"] == regular.headers["content-type"]
+    assert fast.headers["ETag"] == regular.headers["ETag"]
+
+
+def test_fast_path_keeps_cursor_header(client, auth_headers, fast_path):
+    for i in range(3):
+        client.post("/todos", json={"title": f"Page {i}"}, headers=auth_headers)
+    first = client.get("/todos", params={"limit": 2}, headers=auth_headers)
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get("/todos", params={"limit": 2, "cursor": cursor}, headers=auth_headers)
+    ids = [todo["id"] for todo in first.json() + second.json()]
+    assert len(ids) == len(set(ids)) == 3
+
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    rows = [(
+        "Title", None, "high", "work",
+        datetime(2030, 1, 1, 12, 0, 0, 120000, tzinfo=timezone.utc),
+        1, True,
+        datetime(2024, 1, 1, 8, tzinfo=timezone(timedelta(hours=2))),
+        None,
+        datetime(2024, 1, 2),
+        7,
+    )]
+    encoded = serialization.todo_rows_json(rows)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.todo_rows_json(rows) == encoded
+    assert b'"due_date":"2030-01-01T12:00:00.120000Z"' in encoded
+
+
+def test_sparse_fieldset_on_list(client, auth_headers):
+    client.post("/todos", json={"title": "Sparse", "description": "long text"}, headers=auth_headers)
+    response = client.get("/todos", params={"fields": "title,id,completed"}, headers=auth_headers)
+    assert response.status_code == 200
+    todo = response.json()[0]
+    # Keys come back in the usual response order
+    assert list(todo) == ["title", "id", "completed"]
+    assert todo["title"] == "Sparse"
+
+
+def test_sparse_fieldset_pages_with_cursor(client, auth_headers):
+    for i in range(3):
+        client.post("/todos", json={"title": f"Sparse page {i}"}, headers=auth_headers)
+    first = client.get("/todos", params={"limit": 2, "fields": "title"}, headers=auth_headers)
+    assert list(first.json()[0]) == ["title"]
+    second = client.get(
+        "/todos",
+        params={"limit": 2, "fields": "title", "cursor": first.headers["X-Next-Cursor"]},
+        headers=auth_headers,
+    )
+    titles = [todo["title"] for todo in first.json() + second.json()]
+    assert titles == ["Sparse page 2", "Sparse page 1", "Sparse page 0"]
+
+
+def test_sparse_fieldset_on_single_todo(client, auth_headers):
+    todo = client.post("/todos", json={"title": "One", "priority": "low"}, headers=auth_headers).json()
+    response = client.get(f"/todos/{todo['id']}", params={"fields": "priority,due_date"}, headers=auth_headers)
+    assert response.json() == {"priority": "low", "due_date": None}
+    assert "ETag" in response.headers
+
+    missing = client.get("/todos/999999", params={"fields": "title"}, headers=auth_headers)
+    assert missing.status_code == 404
+
+
+def test_unknown_field_is_rejected(client, auth_headers):
+    response = client.get("/todos", params={"fields": "title,hashed_password"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown field: hashed_password"
@@ -0,0 +1,117 @@
+"""
+Tests for routing users' todos across database shards
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+import crud
+import manage
+import shards
+from config import settings
+from database import SessionLocal
+from models import ArchivedTodo, Todo, UserShard
+from schemas import TodoCreate, TodoUpdate
+
+
+@pytest.fixture
+def two_shards(monkeypatch):
+    """Add a second SQLite shard for the duration of a test"""
+    path = os.path.join(tempfile.mkdtemp(prefix="todo-shard-"), "shard1.db")
+    shard = shards.Shard.from_url(1, f"sqlite:///{path}")
+    manage.migrate_shard(shard)
+    monkeypatch.setattr(shards.router, "shards", [shards.router.shards[0], shard])
+    yield shard
+    shards.router._cache.clear()
+
+
+def _register_on_shard(client, shard_id):
+    """Register users until one is placed on the given shard"""
+    for _ in range(4):
+        email = f"shard-{uuid.uuid4().hex[:12]}@example.com"
+        user = client.post(
+            "/auth/register", json={"email": email, "full_name": "Sharded", "password": "secret-password"}
+        ).json()
+        if user["id"] % 2 == shard_id:
+            token = client.post("/auth/login", params={"email": email, "password": "secret-password"}).json()
+            return user["id"], {"Authorization": f"Bearer {token['access_token']}"}
+    raise AssertionError("no user landed on the shard")
+
+
+def _todo_count(engine, user_id):
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count(Todo.id)).where(Todo.owner_id == user_id))
+
+
+def test_todos_are_stored_on_the_users_shard(client, two_shards):
+    user_id, headers = _register_on_shard(client, 1)
+    todo = client.post("/todos", json={"title": "Far away"}, headers=headers).json()
+
+    assert todo["id"] > shards.SHARD_ID_SPACE
+    assert _todo_count(two_shards.engine, user_id) == 1
+    assert _todo_count(shards.router.shards[0].engine, user_id) == 0
+    with SessionLocal() as db:
+        assert db.get(UserShard, user_id).shard == 1
+
+    client.put(f"/todos/{todo['id']}", json={"completed": True}, headers=headers)
+    assert client.get("/todos", headers=headers).json()[0]["completed"] is True
+    assert client.get("/todos/stats/summary", headers=headers).json()["completed"] == 1
+    assert [t["id"] for t in client.get("/todos", params={"search": "far"}, headers=headers).json()] == [todo["id"]]
+
+
+def test_move_user_between_shards(client, two_shards):
+    user_id, headers = _register_on_shard(client, 0)
+    ids = [client.post("/todos", json={"title": f"Mover {i}"}, headers=headers).json()["id"] for i in range(3)]
+    etag = client.get("/todos", headers=headers).headers["ETag"]
+
+    assert shards.move_user(user_id, 1, settle_seconds=0) > 3
+    assert _todo_count(shards.router.shards[0].engine, user_id) == 0
+    assert _todo_count(two_shards.engine, user_id) == 3
+
+    response = client.get("/todos", headers=headers)
+    assert sorted(todo["id"] for todo in response.json()) == sorted(ids)
+    # The data version moved too, so cached copies stay valid
+    assert response.headers["ETag"] == etag
+
+    client.post("/todos", json={"title": "After the move"}, headers=headers)
+    assert _todo_count(two_shards.engine, user_id) == 4
+
+    shards.move_user(user_id, 0, settle_seconds=0)
+    assert len(client.get("/todos", headers=headers).json()) == 4
+
+
+def test_move_keeps_writes_from_stale_routes(client, two_shards, monkeypatch):
+    user_id, headers = _register_on_shard(client, 0)
+    kept = client.post("/todos", json={"title": "Before the move"}, headers=headers).json()
+    primary = shards.router.shards[0]
+
+    def stale_worker_writes(seconds):
+        # Another worker still routes the user to shard 0 while the move settles
+        assert seconds == settings.user_cache_ttl_seconds
+        with primary.SessionLocal() as db:
+            crud.create_todo(db, TodoCreate(title="During the move"), user_id)
+            crud.update_todo(db, kept["id"], TodoUpdate(title="Renamed during the move"), user_id)
+
+    monkeypatch.setattr(shards.time, "sleep", stale_worker_writes)
+    shards.move_user(user_id, 1)
+    assert _todo_count(primary.engine, user_id) == 0
+
+    titles = sorted(todo["title"] for todo in client.get("/todos", headers=headers).json())
+    assert titles == ["During the move", "Renamed during the move"]
+    with two_shards.SessionLocal() as db:
+        assert crud.get_todo_stats(db, user_id)["total"] == 2
+
+
+def test_todo_ids_hold_every_shards_range():
+    # A 32-bit SERIAL could not start shard 1 at SHARD_ID_SPACE
+    assert shards.SHARD_ID_SPACE > 2 ** 31
+    for table in (Todo.__table__, ArchivedTodo.__table__):
+        assert table.c.id.type.compile(dialect=postgresql.dialect()) == "BIGINT"
+    assert "id BIGSERIAL" in str(CreateTable(Todo.__table__).compile(dialect=postgresql.dialect()))
+    # INTEGER PRIMARY KEY is what SQLite's AUTOINCREMENT needs
+    assert "id INTEGER NOT NULL" in str(CreateTable(Todo.__table__).compile(dialect=sqlite.dialect()))
@@ -0,0 +1,88 @@
+"""
+Tests for the todo statistics summary and per-user counters
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from config import settings
+from database import SessionLocal, engine
+from models import TodoCounter
+
+
+def _create_todos(client, headers):
+    yesterday = (datetime.now() - timedelta(days=1)).isoformat()
+    today = datetime.now().replace(hour=23, minute=0).isoformat()
+    todos = [
+        {"title": "Overdue", "priority": "high", "category": "work", "due_date": yesterday},
+        {"title": "Due today", "priority": "low", "category": "health", "due_date": today},
+        {"title": "No due date", "priority": "medium", "category": "work"},
+    ]
+    ids = []
+    for todo in todos:
+        response = client.post("/todos", json=todo, headers=headers)
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+
+def _check_summary(client, headers):
+    ids = _create_todos(client, headers)
+    client.put(f"/todos/{ids[2]}", json={"completed": True, "priority": "high"}, headers=headers)
+    client.delete(f"/todos/{ids[1]}", headers=headers)
+
+    stats = client.get("/todos/stats/summary", headers=headers).json()
+    assert stats["total"] == 2
+    assert stats["completed"] == 1
+    assert stats["active"] == 1
+    assert stats["overdue"] == 1
+    assert stats["due_today"] == 0
+    assert stats["by_priority"] == {"low": 0, "medium": 0, "high": 2}
+    assert stats["by_category"] == {
+        "personal": 0, "work": 2, "shopping": 0, "health": 0, "other": 0
+    }
+
+
+def test_stats_summary(client, auth_headers):
+    """Stats are computed from the todos table"""
+    _check_summary(client, auth_headers)
+
+
+def test_stats_due_today(client, auth_headers):
+    """Todos due later today count as due today, not overdue"""
+    _create_todos(client, auth_headers)
+    stats = client.get("/todos/stats/summary", headers=auth_headers).json()
+    assert stats["overdue"] == 1
+    assert stats["due_today"] == 1
+
+
+def test_stats_summary_with_counters(client, auth_headers, monkeypatch):
+    """Counters kept by crud give the same summary and show no drift"""
+    monkeypatch.setattr(settings, "todo_counters_enabled", True)
+    _check_summary(client, auth_headers)
+
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    db = SessionLocal()
+    try:
+        assert crud.verify_todo_counters(db, user_id) == {}
+    finally:
+        db.close()
+
+
+def test_stats_on_a_read_replica_without_counters(client, auth_headers, monkeypatch):
+    """A replica can't build missing counters, so it counts the todos instead"""
+    _create_todos(client, auth_headers)
+    monkeypatch.setattr(settings, "todo_counters_enabled", True)
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+
+    replica = create_engine(f"sqlite:///file:{engine.url.database}?mode=ro&uri=true")
+    try:
+        with sessionmaker(bind=replica, info={"read_only": True})() as db:
+            stats = crud.get_todo_stats(db, user_id)
+            assert db.get(TodoCounter, user_id) is None
+    finally:
+        replica.dispose()
+    assert stats["total"] == 3
+    assert stats["by_category"]["work"] == 2
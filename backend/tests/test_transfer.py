@@ -0,0 +1,61 @@
+"""
+Tests for streaming todo export and import
+"""
+import csv
+import io
+import json
+
+import transfer
+
+
+def _seed(client, headers):
+    client.post(
+        "/todos/batch",
+        json={"todos": [
+            {"title": "Plain"},
+            {"title": 'Quoted "title"', "description": "Line one\nline two, with comma", "priority": "high"},
+            {"title": "Dated", "category": "health", "due_date": "2030-05-01T09:30:00"},
+        ]},
+        headers=headers,
+    )
+    return client.get("/todos", headers=headers).json()[::-1]
+
+
+def test_ndjson_export_matches_todo_responses(client, auth_headers):
+    todos = _seed(client, auth_headers)
+    response = client.get("/todos/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == todos
+
+
+def test_csv_round_trip(client, auth_headers, monkeypatch):
+    todos = _seed(client, auth_headers)
+    exported = client.get("/todos/export", params={"format": "csv"}, headers=auth_headers).text
+    rows = list(csv.DictReader(io.StringIO(exported)))
+    assert [row["title"] for row in rows] == [todo["title"] for todo in todos]
+
+    # Small chunks exercise several bulk inserts
+    monkeypatch.setattr(transfer, "IMPORT_CHUNK_SIZE", 2)
+    response = client.post(
+        "/todos/import", params={"format": "csv"}, content=exported.encode(), headers=auth_headers
+    )
+    assert response.json() == {"imported": 3, "errors": []}
+
+    copies = [todo for todo in client.get("/todos", headers=auth_headers).json() if todo["id"] not in {t["id"] for t in todos}]
+    assert sorted(todo["description"] or "" for todo in copies) == sorted(todo["description"] or "" for todo in todos)
+
+
+def test_ndjson_import_reports_invalid_rows(client, auth_headers):
+    body = "\n".join([
+        json.dumps({"title": "Good", "completed": True}),
+        json.dumps({"title": ""}),
+        json.dumps({"title": "Also good", "priority": "low"}),
+    ])
+    response = client.post("/todos/import", content=body.encode(), headers=auth_headers)
+    result = response.json()
+    assert result["imported"] == 2
+    assert [error["record"] for error in result["errors"]] == [2]
+
+    todos = client.get("/todos", params={"completed": True}, headers=auth_headers).json()
+    assert [todo["title"] for todo in todos] == ["Good"]
@@ -0,0 +1,123 @@
+"""
+Tests for group commit of single-todo writes
+"""
+import asyncio
+from contextlib import contextmanager
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+
+import async_crud
+import crud
+import main
+import writes
+from config import settings
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from schemas import TodoCreate, TodoUpdate
+
+
+@pytest_asyncio.fixture
+async def coalescing(monkeypatch):
+    monkeypatch.setattr(settings, "write_coalescing_enabled", True)
+    monkeypatch.setattr(settings, "write_max_latency_ms", 20.0)
+    yield
+    await writes.close()
+
+
+@contextmanager
+def _count_commits():
+    commits = []
+
+    def record(conn):
+        commits.append(1)
+
+    event.listen(async_engine.sync_engine, "commit", record)
+    try:
+        yield commits
+    finally:
+        event.remove(async_engine.sync_engine, "commit", record)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_toggles_share_a_commit(client, auth_headers, coalescing):
+    todo_ids = [
+        client.post("/todos", json={"title": f"Toggle {i}"}, headers=auth_headers).json()["id"]
+        for i in range(10)
+    ]
+    version = client.get("/todos", headers=auth_headers).headers["ETag"]
+
+    with _count_commits() as commits:
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as async_client:
+            responses = await asyncio.gather(*[
+                async_client.put(f"/todos/{todo_id}", json={"completed": True}, headers=auth_headers)
+                for todo_id in todo_ids
+            ])
+
+    assert [response.json()["id"] for response in responses] == todo_ids
+    assert all(response.json()["completed"] for response in responses)
+    assert 1 <= len(commits) < 10
+    todos = client.get("/todos", headers=auth_headers)
+    assert all(todo["completed"] for todo in todos.json())
+    assert todos.headers["ETag"] != version
+
+
+@pytest.mark.asyncio
+async def test_failed_write_only_fails_its_own_request(client, auth_headers, coalescing):
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+
+    def broken(db):
+        raise ValueError("bad write")
+
+    async def create(db, title):
+        return await async_crud.create_todo(db, TodoCreate(title=title), user_id)
+
+    async with AsyncSessionLocal() as db:
+        results = await asyncio.gather(
+            create(db, "Before"),
+            writes.submit(db, broken),
+            create(db, "After"),
+            return_exceptions=True,
+        )
+
+    assert [todo.title for todo in (results[0], results[2])] == ["Before", "After"]
+    assert isinstance(results[1], ValueError)
+    titles = sorted(todo["title"] for todo in client.get("/todos", headers=auth_headers).json())
+    assert titles == ["After", "Before"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_writes(client, auth_headers, coalescing, monkeypatch):
+    monkeypatch.setattr(settings, "write_queue_size", 1)
+    await writes.close()
+    async with httpx.AsyncClient(app=main.app, base_url="http://test") as async_client:
+        responses = await asyncio.gather(*[
+            async_client.post("/todos", json={"title": f"Shed {i}"}, headers=auth_headers)
+            for i in range(5)
+        ])
+    codes = sorted(response.status_code for response in responses)
+    assert 503 in codes and 200 in codes
+    shed = next(response for response in responses if response.status_code == 503)
+    assert shed.headers["Retry-After"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_writes_to_one_todo_in_a_batch_see_each_other(client, auth_headers, coalescing, monkeypatch):
+    monkeypatch.setattr(settings, "todo_counters_enabled", True)
+    todo_id = client.post("/todos", json={"title": "Flip flop"}, headers=auth_headers).json()["id"]
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+
+    with _count_commits() as commits:
+        async with AsyncSessionLocal() as db:
+            done, reopened = await asyncio.gather(
+                writes.submit(db, crud.update_todo, todo_id, TodoUpdate(completed=True), user_id),
+                writes.submit(db, crud.update_todo, todo_id, TodoUpdate(completed=False), user_id),
+            )
+    assert len(commits) == 1
+
+    assert done.completed and done.completed_at
+    assert not reopened.completed and reopened.completed_at is None
+    assert not client.get(f"/todos/{todo_id}", headers=auth_headers).json()["completed"]
+    with SessionLocal() as db:
+        assert crud.verify_todo_counters(db, user_id) == {}
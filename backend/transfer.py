@@ -0,0 +1,143 @@
+"""
+Streaming export and import of a user's todos as NDJSON or CSV
+
+Exports read through a server-side cursor and write one line per row, and
+imports parse the request body as it arrives and insert in fixed-size
+chunks, so memory use does not grow with the number of todos.
+"""
+import csv
+import codecs
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, List
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from schemas import TodoImport, TodoResponse
+import async_crud
+import shards
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Export columns, in the same order as the API's todo responses
+EXPORT_FIELDS = list(TodoResponse.model_fields)
+
+EXPORT_CHUNK_SIZE = 500
+IMPORT_CHUNK_SIZE = 500
+
+# Stop collecting per-row errors after this many
+MAX_IMPORT_ERRORS = 100
+
+def _export_value(value):
+    """Convert a column value to its JSON form in TodoResponse"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def export_todos(user_id: int, format: str) -> AsyncIterator[bytes]:
+    """Stream a user's todos, batching rows into chunks of output"""
+    # The stream outlives the request handler, so it owns its session
+    async with shards.router.session(user_id, read=True) as db:
+        buffer = io.StringIO()
+        writer = None
+        if format == "csv":
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+
+        rows = 0
+        async for row in async_crud.stream_todos(db, user_id, EXPORT_FIELDS, EXPORT_CHUNK_SIZE):
+            values = [_export_value(row[field]) for field in EXPORT_FIELDS]
+            if writer is not None:
+                writer.writerow(["" if value is None else value for value in values])
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values))))
+                buffer.write("\n")
+
+            rows += 1
+            if rows % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines without buffering it all"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def _ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    async for line in _lines(chunks):
+        if line.strip():
+            yield json.loads(line)
+
+async def _csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    header = None
+    record = []
+    async for line in _lines(chunks):
+        record.append(line)
+        # A quoted field can span lines; the record ends once quotes balance
+        text = "\n".join(record)
+        if text.count('"') % 2:
+            continue
+        record = []
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+            continue
+        yield {key: (value if value != "" else None) for key, value in zip(header, values)}
+
+async def import_todos(db: AsyncSession, chunks: AsyncIterator[bytes], format: str, user_id: int) -> dict:
+    """Parse todos from a byte stream and insert them in bulk chunks on db
+
+    Each chunk is committed on its own, so a long import makes progress
+    without holding one huge transaction. Rows that fail validation are
+    skipped and reported by their position among the records.
+    """
+    records = _csv_records(chunks) if format == "csv" else _ndjson_records(chunks)
+    position = 0
+    imported = 0
+    errors: List[dict] = []
+    batch: List[TodoImport] = []
+
+    try:
+        async for record in records:
+            position += 1
+            try:
+                batch.append(TodoImport.model_validate(record))
+            except ValidationError as exc:
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"record": position, "error": exc.errors(include_url=False)[0]["msg"]})
+                continue
+
+            if len(batch) >= IMPORT_CHUNK_SIZE:
+                imported += len(await async_crud.create_todos(db, batch, user_id))
+                batch = []
+    except (ValueError, csv.Error) as exc:
+        # Malformed JSON or CSV ends the import; earlier chunks are kept
+        errors.append({"record": position + 1, "error": str(exc)})
+
+    if batch:
+        imported += len(await async_crud.create_todos(db, batch, user_id))
+
+    return {"imported": imported, "errors": errors}
@@ -0,0 +1,180 @@
+"""
+Group commit for single-todo writes
+
+With WRITE_COALESCING_ENABLED, create/update/delete of a single todo are
+queued instead of committing on the request's own session. One worker per
+database collects the writes arriving within WRITE_MAX_LATENCY_MS, up to
+WRITE_MAX_BATCH, runs them in order in one transaction and commits once.
+Then it publishes their events and resolves each caller with its own
+result. Under bursts of checkbox toggles this turns many small fsyncs
+into one.
+
+If anything in a batch fails, the batch is rolled back and its writes are
+retried one transaction each, so a bad write only fails its own request.
+When the queue is full, callers get WriteQueueFull instead of waiting.
+"""
+import asyncio
+import contextvars
+import logging
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from config import settings
+import events
+
+logger = logging.getLogger(__name__)
+
+class WriteQueueFull(Exception):
+    """Raised when a database's write queue is full"""
+
+class GroupCommitSession(Session):
+    """Session whose commit() only flushes while a batch is being applied"""
+
+    in_batch = False
+
+    def commit(self):
+        if self.in_batch:
+            self.flush()
+        else:
+            super().commit()
+
+class _Write:
+    __slots__ = ("func", "args", "future")
+
+    def __init__(self, func: Callable, args: tuple, future: asyncio.Future):
+        self.func = func
+        self.args = args
+        self.future = future
+
+def _apply(db: GroupCommitSession, batch: List[_Write]):
+    """Run a batch of crud writes in one transaction and commit it"""
+    db.in_batch = True
+    results = []
+    try:
+        with events.deferred() as pending:
+            for write in batch:
+                results.append(write.func(db, *write.args))
+                # Each result is its caller's snapshot. Left in the identity
+                # map, a later write's RETURNING would hand back that same
+                # object with its old values instead of the row's new ones.
+                db.flush()
+                db.expunge_all()
+    finally:
+        db.in_batch = False
+    db.commit()
+    return results, pending
+
+class WritePipeline:
+    """Queue and worker coalescing the writes to one database"""
+
+    def __init__(self, engine, queue_size: int, max_batch: int, max_latency: float):
+        self.session_factory = async_sessionmaker(
+            engine, sync_session_class=GroupCommitSession, autoflush=False, expire_on_commit=False
+        )
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        # Run outside any request's context, e.g. its metrics
+        self.worker = asyncio.get_running_loop().create_task(
+            self._run(), context=contextvars.Context()
+        )
+
+    async def submit(self, func: Callable, *args):
+        """Queue a crud write and wait for its result after the shared commit"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(_Write(func, args, future))
+        except asyncio.QueueFull:
+            raise WriteQueueFull()
+        return await future
+
+    async def _collect(self) -> List[_Write]:
+        """Wait for a write, then gather more until the batch or latency limit"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch:
+            if self.queue.empty():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._commit(batch)
+            except Exception as exc:
+                logger.exception("Group commit failed")
+                for write in batch:
+                    _settle(write, exception=exc)
+
+    async def _commit(self, batch: List[_Write]):
+        failure = None
+        async with self.session_factory() as db:
+            try:
+                results, pending = await db.run_sync(_apply, batch)
+            except Exception as exc:
+                await db.rollback()
+                failure = exc
+        
+        if failure is not None:
+            if len(batch) == 1:
+                _settle(batch[0], exception=failure)
+            else:
+                # Find the failing write by retrying each on its own
+                for write in batch:
+                    await self._commit([write])
+            return
+        
+        for user_id, event in pending:
+            events.publish(user_id, event)
+        for write, result in zip(batch, results):
+            _settle(write, result=result)
+
+def _settle(write: _Write, result=None, exception: Optional[BaseException] = None):
+    if write.future.done():
+        # The request went away while its write was queued
+        return
+    if exception is not None:
+        write.future.set_exception(exception)
+    else:
+        write.future.set_result(result)
+
+_pipelines: Dict[tuple, WritePipeline] = {}
+
+def _pipeline(db: AsyncSession) -> WritePipeline:
+    """Return the pipeline for the database a session is bound to"""
+    loop = asyncio.get_running_loop()
+    key = (id(db.bind), id(loop))
+    pipeline = _pipelines.get(key)
+    if pipeline is None or pipeline.worker.get_loop() is not loop or pipeline.worker.done():
+        pipeline = _pipelines[key] = WritePipeline(
+            db.bind,
+            settings.write_queue_size,
+            settings.write_max_batch,
+            settings.write_max_latency_ms / 1000,
+        )
+    return pipeline
+
+async def submit(db: AsyncSession, func: Callable, *args):
+    """Run a crud write through the group-commit pipeline for db's database"""
+    return await _pipeline(db).submit(func, *args)
+
+async def close():
+    """Stop this event loop's pipeline workers, cancelling writes still queued"""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _pipelines if key[1] == loop_id]:
+        pipeline = _pipelines.pop(key)
+        pipeline.worker.cancel()
+        while not pipeline.queue.empty():
+            pipeline.queue.get_nowait().future.cancel()